@@ -0,0 +1,88 @@
+import os
+import time
+import argparse
+import statistics
+from typing import Any, Dict, List
+
+import bson
+from dotenv import load_dotenv
+
+from database import create_mongo_client, get_products_collection
+from encoders import SAMPLE_SENTENCES, encoder_config_from_env, load_encoder
+from search_backend import AtlasSearchBackend, SEARCH_FIELDS
+from text_chunker import aggregate_search_results
+
+
+def payload_bytes(documents: List[Dict[str, Any]]) -> int:
+    """
+    BSON size of the documents returned by the server (what crosses the wire)
+    """
+    return sum(len(bson.encode(doc)) for doc in documents)
+
+
+def python_side(backend: AtlasSearchBackend, query_vector, limit: int, chunk_limit: int):
+    chunks = backend.search(query_vector, limit=chunk_limit, num_candidates=chunk_limit * 5, fields=SEARCH_FIELDS)
+    # Same product join as /search, so both modes return complete rows
+    return backend.catalog.attach(aggregate_search_results(chunks, max_products=limit)), payload_bytes(chunks)
+
+
+def server_side(backend: AtlasSearchBackend, query_vector, limit: int, chunk_limit: int):
+    products = backend.search_products(query_vector, limit=limit, chunk_limit=chunk_limit,
+                                       num_candidates=chunk_limit * 5)
+    return products, payload_bytes(products)
+
+
+def run_benchmark(backend: AtlasSearchBackend, query_vectors: List[List[float]],
+                  limit: int, chunk_limit: int, repeats: int) -> None:
+    """
+    Time both aggregation modes on the same query vectors and compare payloads and top products
+    """
+    modes = {"python": python_side, "server": server_side}
+    latencies = {mode: [] for mode in modes}
+    payloads = {mode: [] for mode in modes}
+    same_products = 0
+
+    for query_vector in query_vectors:
+        top_products = {}
+        for mode, run in modes.items():
+            run(backend, query_vector, limit, chunk_limit)  # Warm-up
+            for _ in range(repeats):
+                start = time.perf_counter()
+                products, size = run(backend, query_vector, limit, chunk_limit)
+                latencies[mode].append((time.perf_counter() - start) * 1000)
+            payloads[mode].append(size)
+            top_products[mode] = [product['product_id'] for product in products]
+        same_products += top_products["python"] == top_products["server"]
+
+    print(f"limit={limit}, chunk_limit={chunk_limit}, {len(query_vectors)} queries x {repeats} runs")
+    print(f"{'mode':<8} {'p50 ms':>8} {'p95 ms':>8} {'avg payload KB':>15}")
+    for mode in modes:
+        values = sorted(latencies[mode])
+        p95 = values[max(0, int(len(values) * 0.95) - 1)]
+        print(f"{mode:<8} {statistics.median(values):>8.1f} {p95:>8.1f} "
+              f"{statistics.mean(payloads[mode]) / 1024:>15.1f}")
+    print(f"Same products in the same order for {same_products}/{len(query_vectors)} queries")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Python-side and server-side chunk aggregation for /search")
+    parser.add_argument("--limit", type=int, default=5, help="Products per query (default: 5)")
+    parser.add_argument("--chunk-limit", type=int, nargs="+", default=[20, 100],
+                        help="Chunk limits to benchmark (default: 20 100)")
+    parser.add_argument("--repeats", type=int, default=10, help="Runs per query and mode (default: 10)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = create_mongo_client()
+    db = client[os.getenv('MONGO_DB')]
+    collection = db[os.getenv('MONGO_COLLECTION')]
+    # The products collection lets the server mode join with $lookup, as the API does without a product cache
+    backend = AtlasSearchBackend(collection, index_name=os.getenv('VECTOR_INDEX_NAME', 'vector_search_chunked'),
+                                 products_collection=get_products_collection(db, collection.name))
+
+    model = load_encoder(**encoder_config_from_env())
+    query_vectors = [vector.tolist() for vector in model.encode(SAMPLE_SENTENCES)]
+
+    for chunk_limit in args.chunk_limit:
+        run_benchmark(backend, query_vectors, args.limit, chunk_limit, args.repeats)
+        print()
@@ -0,0 +1,378 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import platform
+import tempfile
+import threading
+import contextlib
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import database
+from text_chunker import TextChunker, aggregate_search_results, process_products_with_chunking
+from search_backend import save_chunk_documents
+from lexical_index import LexicalIndex
+from product_catalog import build_product_metadata, filter_values, products_path_for, save_products
+
+# Vocabulary of the synthetic catalog (Vietnamese product vocabulary, with diacritics)
+BRANDS = ["Cetaphil", "La Roche-Posay", "Innisfree", "Bioderma", "Senka", "Hada Labo", "Cocoon", "Vichy"]
+CATEGORIES = ["Sữa rửa mặt", "Kem chống nắng", "Serum", "Toner", "Mặt nạ", "Kem dưỡng ẩm", "Tẩy trang"]
+WORDS = ("da dầu da khô da nhạy cảm làm sạch dịu nhẹ dưỡng ẩm sâu chống lão hóa làm sáng da giảm mụn "
+         "kiểm soát nhờn cấp nước phục hồi bảo vệ khỏi tia UV thành phần tự nhiên chiết xuất trà xanh "
+         "vitamin C niacinamide axit hyaluronic không cồn không hương liệu phù hợp mọi loại da sử dụng "
+         "hằng ngày buổi sáng buổi tối thoa đều lên mặt massage nhẹ nhàng rửa lại với nước sạch").split()
+
+
+class StubEncoder:
+    """
+    Deterministic encoder for benchmarks: hashed bag of words, L2-normalized
+
+    Texts sharing words get similar vectors, so search results stay meaningful
+    without downloading or running a transformer.
+    """
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            digest = hashlib.md5(word.encode('utf-8')).digest()
+            vector[int.from_bytes(digest[:4], 'little') % self.dim] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs):
+        if isinstance(sentences, str):
+            return self._vector(sentences)
+        return np.vstack([self._vector(text) for text in sentences]) if sentences else np.zeros((0, self.dim))
+
+
+def generate_catalog(size: int, seed: int = 42, min_sentences: int = 2, max_sentences: int = 40) -> List[Dict[str, Any]]:
+    """
+    Generate synthetic products shaped like data/products_data.json
+    """
+    rng = random.Random(seed)
+    products = []
+    for product_id in range(size):
+        category = rng.choice(CATEGORIES)
+        brand = rng.choice(BRANDS)
+        sentences = [
+            " ".join(rng.choices(WORDS, k=rng.randint(6, 25))).capitalize() + "."
+            for _ in range(rng.randint(min_sentences, max_sentences))
+        ]
+        price = rng.randint(50, 1500) * 1000
+        products.append({
+            "data_product": product_id,
+            "name": f"{category} {brand} {' '.join(rng.choices(WORDS, k=3))}",
+            "url": f"https://example.com/p/{product_id}",
+            "brand": brand,
+            "category_name": category,
+            "price": price,
+            "market_price": int(price * rng.uniform(1.0, 1.4)),
+            "average_rating": round(rng.uniform(3, 5), 1),
+            "descriptioninfo": " ".join(sentences)
+        })
+    return products
+
+
+def generate_queries(count: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    return [f"{rng.choice(CATEGORIES).lower()} {' '.join(rng.choices(WORDS, k=rng.randint(2, 6)))}"
+            for _ in range(count)]
+
+
+class PeakRSS:
+    """
+    Sample the resident set size in a background thread and keep the maximum (MB)
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current() -> float:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        except (OSError, ValueError, AttributeError):
+            # Not Linux: fall back to the process-wide peak
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            time.sleep(self.interval)
+
+    def __enter__(self) -> "PeakRSS":
+        self.peak = self.current()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def summarize(latencies: List[float], items: int, elapsed: float, peak_rss: float) -> Dict[str, Any]:
+    """
+    Throughput, latency percentiles (ms) and peak RSS of one stage
+    """
+    values = np.asarray(latencies, dtype=np.float64) * 1000
+    return {
+        "items": items,
+        "calls": len(latencies),
+        "seconds": round(elapsed, 4),
+        "throughput_per_second": round(items / elapsed, 2) if elapsed > 0 else None,
+        "p50_ms": round(float(np.percentile(values, 50)), 4) if len(values) else None,
+        "p95_ms": round(float(np.percentile(values, 95)), 4) if len(values) else None,
+        "p99_ms": round(float(np.percentile(values, 99)), 4) if len(values) else None,
+        "peak_rss_mb": round(peak_rss, 1)
+    }
+
+
+def time_calls(fn: Callable[[Any], Any], inputs: List[Any], items_per_call: Callable[[Any], int] = lambda _: 1):
+    """
+    Call fn on every input and summarize
+    """
+    latencies, items = [], 0
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        for value in inputs:
+            call_start = time.perf_counter()
+            fn(value)
+            latencies.append(time.perf_counter() - call_start)
+            items += items_per_call(value)
+        elapsed = time.perf_counter() - start
+    return summarize(latencies, items, elapsed, rss.peak)
+
+
+def bench_chunk_text(products: List[Dict[str, Any]], chunk_size: int, overlap: int) -> Dict[str, Any]:
+    chunker = TextChunker(chunk_size=chunk_size, overlap=overlap)
+    descriptions = [product["descriptioninfo"] for product in products]
+    result = time_calls(chunker.chunk_text, descriptions)
+    result["characters_per_second"] = round(sum(map(len, descriptions)) / result["seconds"], 1)
+    return result
+
+
+def bench_process_products(products: List[Dict[str, Any]], encoder: StubEncoder,
+                           chunk_size: int, overlap: int) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    with PeakRSS() as rss, contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        documents = process_products_with_chunking(products, encoder, chunk_size=chunk_size, overlap=overlap)
+        elapsed = time.perf_counter() - start
+    result = summarize([elapsed], len(documents), elapsed, rss.peak)
+    result["products"] = len(products)
+    result["unit"] = "chunks"
+    return result, documents
+
+
+def bench_aggregate(documents: List[Dict[str, Any]], chunk_limit: int, rounds: int, seed: int = 3) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    result_sets = []
+    for _ in range(rounds):
+        sample = rng.sample(documents, min(chunk_limit, len(documents)))
+        scores = sorted((rng.random() for _ in sample), reverse=True)
+        result_sets.append([dict(doc, score=score) for doc, score in zip(sample, scores)])
+
+    results = {}
+    for scoring in ("max", "sum_top_n", "softmax"):
+        results[scoring] = time_calls(lambda chunks: aggregate_search_results(chunks, max_products=5, scoring=scoring),
+                                      result_sets, items_per_call=len)
+        results[scoring]["unit"] = "chunks"
+    return results
+
+
+def write_offline_index(work_dir: str, documents: List[Dict[str, Any]], products: List[Dict[str, Any]]) -> str:
+    """
+    Write chunk documents, product metadata and the lexical index as load_data.py would
+
+    Returns the local index path; the lexical index is written to ``<work_dir>/lexical_index``.
+    """
+    index_path = os.path.join(work_dir, "chunks.jsonl")
+    metadata = {product["data_product"]: build_product_metadata(product) for product in products}
+    # Filter fields are copied into the chunks, as load_data.py does
+    chunks = [dict(doc, **filter_values(metadata[doc["product_id"]])) for doc in documents]
+    save_chunk_documents(chunks, index_path)
+    save_products(metadata.values(), products_path_for(index_path))
+    LexicalIndex.build(chunks, {product_id: doc.get("name") for product_id, doc in metadata.items()}).save(
+        os.path.join(work_dir, "lexical_index"))
+    return index_path
+
+
+def load_offline_app(index_path: str, encoder=None, index_mode: Optional[str] = None,
+                     lexical_index_path: str = ""):
+    """
+    Import the API module with the local backend over index_path and no MongoDB
+
+    Must be called before main is imported anywhere else. When encoder is given
+    it replaces the transformer; otherwise the configured model is loaded.
+    Without lexical_index_path the API searches by vector only.
+    """
+    os.environ.update({"SEARCH_BACKEND": "local", "LOCAL_INDEX_PATH": index_path, "STARTUP_MODE": "eager",
+                       "LEXICAL_INDEX_PATH": lexical_index_path})
+    if index_mode:
+        os.environ["LOCAL_INDEX_MODE"] = index_mode
+
+    def offline_client():
+        raise RuntimeError("offline benchmark: MongoDB disabled")
+
+    database.create_mongo_client = offline_client
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main
+    if encoder is not None:
+        main.load_encoder = lambda *args, **kwargs: encoder
+    return main
+
+
+def bench_search_endpoint(work_dir: str, documents: List[Dict[str, Any]], products: List[Dict[str, Any]],
+                          encoder: StubEncoder, queries: List[str], limit: int, chunk_limit: int,
+                          concurrency: int, index_mode: str, search_mode: str = "hybrid") -> Dict[str, Any]:
+    """
+    /search end to end through the FastAPI app (ASGI transport, local backend, stub encoder)
+    """
+    import httpx
+
+    os.environ.update({"RESPONSE_CACHE_BACKEND": "none", "SEARCH_AGGREGATION": "python", "SEARCH_MODE": search_mode})
+    main = load_offline_app(write_offline_index(work_dir, documents, products), encoder, index_mode,
+                            lexical_index_path=os.path.join(work_dir, "lexical_index"))
+
+    async def run() -> Dict[str, Any]:
+        latencies: List[float] = []
+        semaphore = asyncio.Semaphore(concurrency)
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+                async def one(text: str) -> None:
+                    async with semaphore:
+                        start = time.perf_counter()
+                        response = await client.post("/search", json={"text": text, "limit": limit,
+                                                                      "chunk_limit": chunk_limit})
+                        response.raise_for_status()
+                        latencies.append(time.perf_counter() - start)
+
+                await one(queries[0])  # Warm-up
+                latencies.clear()
+                with PeakRSS() as rss:
+                    start = time.perf_counter()
+                    await asyncio.gather(*(one(text) for text in queries))
+                    elapsed = time.perf_counter() - start
+        result = summarize(latencies, len(queries), elapsed, rss.peak)
+        result.update(concurrency=concurrency, index_mode=index_mode, search_mode=search_mode, unit="requests")
+        return result
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return asyncio.run(run())
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    """
+    Print throughput and p95 changes of every stage against a previous result file
+    """
+    def flatten(stages: Dict[str, Any], prefix: str = "") -> Dict[str, Dict[str, Any]]:
+        flat = {}
+        for name, value in stages.items():
+            if isinstance(value, dict) and "throughput_per_second" in value:
+                flat[prefix + name] = value
+            elif isinstance(value, dict):
+                flat.update(flatten(value, f"{prefix}{name}."))
+        return flat
+
+    old, new = flatten(baseline.get("stages", {})), flatten(current["stages"])
+    print(f"\nCompared with {baseline.get('meta', {}).get('commit')}:")
+    for name, stage in new.items():
+        if name not in old:
+            continue
+        throughput = stage["throughput_per_second"] / old[name]["throughput_per_second"] - 1
+        p95 = stage["p95_ms"] / old[name]["p95_ms"] - 1 if old[name]["p95_ms"] else 0.0
+        print(f"  {name:<32} throughput {throughput:+.1%}  p95 {p95:+.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the chunking, aggregation and search hot paths")
+    parser.add_argument("--products", type=int, default=2000, help="Synthetic catalog size (default: 2000)")
+    parser.add_argument("--queries", type=int, default=300, help="Queries sent to /search (default: 300)")
+    parser.add_argument("--chunk-size", type=int, default=300)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=5, help="Products per /search query (default: 5)")
+    parser.add_argument("--chunk-limit", type=int, default=20, help="Chunks per /search query (default: 20)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent /search requests (default: 8)")
+    parser.add_argument("--index-mode", default="exact", choices=["exact", "ivf", "hnsw"])
+    parser.add_argument("--search-mode", default="hybrid", choices=["vector", "lexical", "hybrid"],
+                        help="SEARCH_MODE of the /search stage (default: hybrid)")
+    parser.add_argument("--dim", type=int, default=768, help="Stub embedding dimension (default: 768)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--stages", nargs="+", default=["chunk_text", "process_products", "aggregate", "search"],
+                        choices=["chunk_text", "process_products", "aggregate", "search"])
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON result file")
+    parser.add_argument("--compare", default=None, help="Previous result file to compare against")
+    args = parser.parse_args()
+
+    products = generate_catalog(args.products, seed=args.seed)
+    encoder = StubEncoder(dim=args.dim)
+    stages: Dict[str, Any] = {}
+    documents: Optional[List[Dict[str, Any]]] = None
+
+    if "chunk_text" in args.stages:
+        stages["chunk_text"] = bench_chunk_text(products, args.chunk_size, args.overlap)
+    if {"process_products", "aggregate", "search"} & set(args.stages):
+        result, documents = bench_process_products(products, encoder, args.chunk_size, args.overlap)
+        if "process_products" in args.stages:
+            stages["process_products"] = result
+    if "aggregate" in args.stages:
+        stages["aggregate"] = bench_aggregate(documents, args.chunk_limit, rounds=max(args.queries, 100))
+    if "search" in args.stages:
+        with tempfile.TemporaryDirectory() as work_dir:
+            stages["search"] = bench_search_endpoint(work_dir, documents, products, encoder,
+                                                     generate_queries(args.queries, seed=args.seed),
+                                                     args.limit, args.chunk_limit, args.concurrency,
+                                                     args.index_mode, args.search_mode)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "parameters": vars(args)
+        },
+        "stages": stages
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for name, stage in stages.items():
+        for label, values in ([(name, stage)] if "p50_ms" in stage else
+                              [(f"{name}.{key}", value) for key, value in stage.items()]):
+            print(f"{label:<28} {values['throughput_per_second']:>12,.1f} {values.get('unit', 'items')}/s  "
+                  f"p50 {values['p50_ms']:.3f} ms  p95 {values['p95_ms']:.3f} ms  p99 {values['p99_ms']:.3f} ms  "
+                  f"peak RSS {values['peak_rss_mb']} MB")
+    print(f"Saved {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
@@ -0,0 +1,157 @@
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import bson
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, OperationFailure
+
+# Server error codes worth retrying (node restarts, elections, time limits)
+TRANSIENT_ERROR_CODES = {6, 7, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+DUPLICATE_KEY_ERROR = 11000
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Return True for network errors and server errors labelled or known as retryable
+    """
+    if isinstance(error, ConnectionFailure):
+        return True
+    if isinstance(error, OperationFailure):
+        return error.has_error_label("RetryableWriteError") or error.code in TRANSIENT_ERROR_CODES
+    return False
+
+
+class BulkWriter:
+    """
+    Unordered bulk inserter with byte-sized batches, concurrent batches and retries
+
+    Documents are split into batches of at most ``max_batch_bytes`` of BSON
+    (a 768-dim chunk document is ~10 KB, so a count-based batch wastes
+    round-trips), sent with unordered ``bulk_write`` by up to ``concurrency``
+    threads, and retried with exponential backoff on transient errors. Documents
+    that still fail are kept in ``failed`` for the final report.
+    """
+
+    def __init__(self,
+                 collection,
+                 max_batch_bytes: int = 4 * 1024 * 1024,
+                 concurrency: int = 4,
+                 max_retries: int = 5,
+                 backoff_seconds: float = 0.5):
+        """
+        Initialize the writer
+
+        Args:
+            collection: Target PyMongo collection
+            max_batch_bytes: Maximum BSON size of one bulk_write call
+            concurrency: Number of batches in flight at once
+            max_retries: Retries per batch on transient errors
+            backoff_seconds: Initial retry delay, doubled on every attempt
+        """
+        self.collection = collection
+        self.max_batch_bytes = max_batch_bytes
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bulk-writer")
+
+        self.inserted = 0
+        self.batches = 0
+        self.retries = 0
+        self.bytes_written = 0
+        self.failed: List[Tuple[Dict[str, Any], str]] = []
+
+    def _split(self, documents: List[Dict[str, Any]]) -> List[Tuple[List[Dict[str, Any]], int]]:
+        batches, batch, batch_bytes = [], [], 0
+        for doc in documents:
+            size = len(bson.encode(doc))
+            if batch and batch_bytes + size > self.max_batch_bytes:
+                batches.append((batch, batch_bytes))
+                batch, batch_bytes = [], 0
+            batch.append(doc)
+            batch_bytes += size
+        if batch:
+            batches.append((batch, batch_bytes))
+        return batches
+
+    def _write_batch(self, documents: List[Dict[str, Any]]) -> Tuple[int, int, List[Tuple[Dict[str, Any], str]]]:
+        """
+        Insert one batch, retrying transient failures
+
+        Returns:
+            (inserted count, retry count, [(failed document, error message)])
+        """
+        pending, inserted, failed = documents, 0, []
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # Exponential backoff with jitter so concurrent batches do not retry in lockstep
+                time.sleep(self.backoff_seconds * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+            try:
+                # InsertOne assigns _id client-side, so a retried document keeps its _id
+                result = self.collection.bulk_write([InsertOne(doc) for doc in pending], ordered=False)
+                return inserted + result.inserted_count, attempt, failed
+            except BulkWriteError as e:
+                inserted += e.details.get("nInserted", 0)
+                retry = []
+                for error in e.details.get("writeErrors", []):
+                    doc = pending[error["index"]]
+                    if error.get("code") == DUPLICATE_KEY_ERROR and attempt:
+                        inserted += 1  # Written by an earlier attempt whose reply was lost
+                    elif error.get("code") in TRANSIENT_ERROR_CODES:
+                        retry.append(doc)
+                    else:
+                        failed.append((doc, error.get("errmsg", "write error")))
+                if not retry:
+                    return inserted, attempt, failed
+                pending = retry
+            except Exception as e:
+                if not is_transient_error(e) or attempt == self.max_retries:
+                    failed.extend((doc, str(e)) for doc in pending)
+                    return inserted, attempt, failed
+
+        failed.extend((doc, "retries exhausted") for doc in pending)
+        return inserted, self.max_retries, failed
+
+    def write(self, documents: List[Dict[str, Any]]) -> int:
+        """
+        Insert documents and wait for all their batches to finish
+
+        Returns:
+            Number of documents that failed permanently
+        """
+        batches = self._split(documents)
+        futures = [self._executor.submit(self._write_batch, batch) for batch, _ in batches]
+
+        failed_count = 0
+        for (_, batch_bytes), future in zip(batches, futures):
+            inserted, retries, failed = future.result()
+            self.inserted += inserted
+            self.retries += retries
+            self.batches += 1
+            self.bytes_written += batch_bytes
+            self.failed.extend(failed)
+            failed_count += len(failed)
+        return failed_count
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Return write counters and the ids of permanently failed documents
+        """
+        return {
+            "inserted": self.inserted,
+            "batches": self.batches,
+            "retries": self.retries,
+            "megabytes_written": round(self.bytes_written / (1024 * 1024), 2),
+            "failed": len(self.failed),
+            "failed_documents": [
+                {"product_id": doc.get("product_id"), "chunk_id": doc.get("chunk_id"), "error": error}
+                for doc, error in self.failed
+            ]
+        }
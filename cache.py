@@ -0,0 +1,341 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize a query string so that trivially different spellings share a cache key
+
+    Applies Unicode NFC normalization (Vietnamese diacritics can arrive composed
+    or decomposed) and collapses whitespace. Case is kept: the bi-encoder is
+    cased, so "Asus ROG" and "asus rog" have different vectors and results.
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFC', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+class LRUCache:
+    """
+    Thread-safe bounded LRU cache with an optional time-to-live per entry
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        """
+        Initialize the cache
+
+        Args:
+            max_size: Maximum number of entries kept; the least recently used is evicted first.
+                      A value of 0 disables the cache.
+            ttl: Seconds an entry stays valid, or None/0 to never expire
+        """
+        self.max_size = max_size
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Return the cached value for key, or None on a miss or expired entry
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store value under key, evicting the least recently used entries if needed
+        """
+        if self.max_size <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Drop all entries (counters are kept)
+        """
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return size and hit/miss counters
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class EmbeddingCache(LRUCache):
+    """
+    LRU cache of query embeddings keyed by the normalized query text
+    """
+
+    def get(self, text: str) -> Optional[Any]:
+        return super().get(normalize_query(text))
+
+    def set(self, text: str, value: Any) -> None:
+        super().set(normalize_query(text), value)
+
+
+def response_cache_key(endpoint: str, text: str, data_version: Optional[str], **params: Any) -> str:
+    """
+    Cache key of an endpoint response: normalized query, request parameters and data version
+
+    Keys of an older data version are never looked up again, so a reload by
+    load_data.py invalidates every cached response (they then expire or get evicted).
+    """
+    payload = json.dumps([endpoint, normalize_query(text), data_version, params], sort_keys=True,
+                         ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache of JSON-serializable endpoint responses with hit/miss counters per endpoint
+    """
+
+    name = "base"
+    # True when get/set do I/O that may block (callers on an event loop run them in a thread)
+    blocking = False
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._counter_lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def _set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def get(self, endpoint: str, key: str) -> Optional[Any]:
+        """
+        Return the cached response for key, or None on a miss (counted for endpoint)
+        """
+        value = self._get(key)
+        with self._counter_lock:
+            counters = self._counters.setdefault(endpoint, {"hits": 0, "misses": 0})
+            counters["hits" if value is not None else "misses"] += 1
+        return value
+
+    def set(self, endpoint: str, key: str, value: Any) -> None:
+        self._set(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the backend, its size and hit/miss counters per endpoint
+        """
+        with self._counter_lock:
+            endpoints = {
+                endpoint: dict(counters, hit_rate=round(counters["hits"] / (counters["hits"] + counters["misses"]), 4))
+                for endpoint, counters in self._counters.items()
+            }
+        return {"backend": self.name, "size": len(self), "endpoints": endpoints}
+
+
+class MemoryResponseCache(ResponseCache):
+    """
+    Response cache in process memory (LRU with TTL)
+    """
+
+    name = "memory"
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = 300):
+        super().__init__()
+        self.cache = LRUCache(max_size=max_size, ttl=ttl)
+
+    def _get(self, key):
+        return self.cache.get(key)
+
+    def _set(self, key, value):
+        self.cache.set(key, value)
+
+    def clear(self):
+        self.cache.clear()
+
+    def __len__(self):
+        return len(self.cache)
+
+
+class SqliteResponseCache(ResponseCache):
+    """
+    Response cache in a local SQLite file, shared by all API worker processes of a host
+
+    Values are stored as JSON; the oldest entries are evicted beyond max_size.
+    """
+
+    name = "disk"
+    blocking = True
+
+    def __init__(self, path: str, max_size: int = 10000, ttl: Optional[float] = 300):
+        super().__init__()
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl or None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        # WAL lets readers in other processes proceed while one process writes
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, created_at REAL, expires_at REAL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created_at)")
+
+    def _get(self, key):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM responses WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False, default=str), now, now + self.ttl if self.ttl else None)
+            )
+            self._connection.execute(
+                "DELETE FROM responses WHERE expires_at <= ? OR key IN "
+                "(SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (now, self.max_size)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def create_response_cache(backend: str, max_size: int = 1024, ttl: Optional[float] = 300,
+                          path: str = "data/.response_cache.sqlite") -> Optional[ResponseCache]:
+    """
+    Create the response cache selected by configuration
+
+    Args:
+        backend: "none", "memory" or "disk"
+        max_size: Maximum number of cached responses
+        ttl: Seconds a response stays valid, or None/0 to keep it until evicted
+        path: SQLite file of the disk backend
+    """
+    if backend in ("", "none"):
+        return None
+    if backend == "memory":
+        return MemoryResponseCache(max_size=max_size, ttl=ttl)
+    if backend == "disk":
+        return SqliteResponseCache(path, max_size=max_size, ttl=ttl)
+    raise ValueError(f"Unknown response cache backend: {backend}")
+
+
+class BackgroundRefresher:
+    """
+    In-memory copy of a value that is reloaded periodically by an asyncio task
+
+    Readers always get the last loaded value immediately; the (blocking) loader
+    runs through ``run`` — typically ``DatabaseExecutor.run`` — so it never
+    blocks the event loop.
+    """
+
+    def __init__(self, loader: Callable[[], Any], run: Callable[..., Awaitable[Any]], interval: float = 60.0):
+        """
+        Initialize the refresher
+
+        Args:
+            loader: Blocking function returning the fresh value
+            run: Coroutine function used to call the loader, e.g. DatabaseExecutor.run
+            interval: Seconds between two refreshes
+        """
+        self.loader = loader
+        self.run = run
+        self.interval = interval
+        self.value: Any = None
+        self.loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> Any:
+        self.value = await self.run(self.loader)
+        self.loaded_at = time.time()
+        return self.value
+
+    async def get(self) -> Any:
+        """
+        Return the cached value, loading it first if it was never loaded
+        """
+        if self.loaded_at is None:
+            await self.refresh()
+        return self.value
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Background refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
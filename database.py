@@ -0,0 +1,154 @@
+import os
+import uuid
+import asyncio
+import functools
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from pymongo import MongoClient
+
+
+def mongo_settings_from_env() -> Dict[str, Any]:
+    """
+    Read MongoDB connection pool and timeout settings from the environment
+
+    Returns:
+        Keyword arguments for ``MongoClient``
+    """
+    return {
+        'maxPoolSize': int(os.getenv('MONGO_MAX_POOL_SIZE', 50)),
+        'minPoolSize': int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+        'serverSelectionTimeoutMS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000)),
+        'connectTimeoutMS': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 10000)),
+        'socketTimeoutMS': int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 30000)),
+        'waitQueueTimeoutMS': int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000)),
+    }
+
+
+def create_mongo_client() -> MongoClient:
+    """
+    Create a MongoClient for the Atlas cluster configured in .env
+    """
+    uri = (f"mongodb+srv://{os.getenv('MONGO_USER')}:{os.getenv('MONGO_PASS')}"
+           f"@{os.getenv('MONGO_HOST')}/?retryWrites=true&w=majority")
+    return MongoClient(uri, **mongo_settings_from_env())
+
+
+# _id of the metadata document holding the precomputed /info statistics
+STATS_DOCUMENT_ID = "chunk_stats"
+# _id of the metadata document holding the data version stamp
+DATA_VERSION_DOCUMENT_ID = "data_version"
+
+
+def get_metadata_collection(db, collection_name: str):
+    """
+    Return the collection storing metadata about the chunk collection (statistics, versions)
+    """
+    return db[os.getenv('MONGO_META_COLLECTION') or f"{collection_name}_meta"]
+
+
+def get_products_collection(db, collection_name: str):
+    """
+    Return the collection storing product metadata once per product (joined into search results)
+    """
+    return db[os.getenv('MONGO_PRODUCTS_COLLECTION') or f"{collection_name}_products"]
+
+
+def compute_chunk_stats(collection, max_time_ms: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Compute chunk statistics of the collection in a single aggregation
+
+    Returns:
+        total_chunks, unique_products and avg/max/min chunks per product
+    """
+    pipeline = [
+        {"$group": {
+            "_id": "$product_id",
+            "chunk_count": {"$sum": 1}
+        }},
+        {"$group": {
+            "_id": None,
+            "total_chunks": {"$sum": "$chunk_count"},
+            "unique_products": {"$sum": 1},
+            "avg_chunks_per_product": {"$avg": "$chunk_count"},
+            "max_chunks_per_product": {"$max": "$chunk_count"},
+            "min_chunks_per_product": {"$min": "$chunk_count"}
+        }}
+    ]
+    kwargs = {'maxTimeMS': max_time_ms} if max_time_ms else {}
+    stats = list(collection.aggregate(pipeline, allowDiskUse=True, **kwargs))
+    chunk_stats = stats[0] if stats else {}
+    chunk_stats.pop("_id", None)
+    return chunk_stats
+
+
+def save_chunk_stats(metadata_collection, stats: Dict[str, Any]) -> None:
+    """
+    Store precomputed chunk statistics in the metadata collection
+    """
+    document = dict(stats, updated_at=datetime.now(timezone.utc))
+    metadata_collection.replace_one({"_id": STATS_DOCUMENT_ID}, document, upsert=True)
+
+
+def load_chunk_stats(metadata_collection) -> Optional[Dict[str, Any]]:
+    """
+    Return the statistics stored by save_chunk_stats, or None if there are none
+    """
+    document = metadata_collection.find_one({"_id": STATS_DOCUMENT_ID})
+    if document is not None:
+        document.pop("_id", None)
+    return document
+
+
+def bump_data_version(metadata_collection) -> str:
+    """
+    Write a new data version stamp, telling running APIs to drop their caches
+
+    Returns:
+        The new version
+    """
+    version = uuid.uuid4().hex
+    metadata_collection.replace_one(
+        {"_id": DATA_VERSION_DOCUMENT_ID},
+        {"version": version, "updated_at": datetime.now(timezone.utc)},
+        upsert=True
+    )
+    return version
+
+
+def load_data_version(metadata_collection) -> Optional[str]:
+    """
+    Return the current data version stamp, or None if load_data.py never wrote one
+    """
+    document = metadata_collection.find_one({"_id": DATA_VERSION_DOCUMENT_ID})
+    return document.get("version") if document else None
+
+
+class DatabaseExecutor:
+    """
+    Bounded thread pool running blocking PyMongo calls outside the event loop
+
+    The pool size should not exceed the client's ``maxPoolSize``: extra threads
+    would only wait for a free connection.
+    """
+
+    def __init__(self, max_workers: int = 16):
+        """
+        Initialize the executor
+
+        Args:
+            max_workers: Maximum number of database calls in flight at once
+        """
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mongo")
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) in the pool and await its result
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,149 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching scheduler for query embeddings
+
+    Queries submitted from concurrent requests are collected for up to
+    ``max_wait_ms`` (or until ``max_batch_size`` is reached) and encoded with a
+    single call to the model in a worker thread, so the event loop is never
+    blocked by the transformer forward pass.
+    """
+
+    def __init__(self,
+                 encode_fn: Callable[[List[str]], Sequence[Any]],
+                 max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0):
+        """
+        Initialize the scheduler
+
+        Args:
+            encode_fn: Function encoding a list of texts into a sequence of vectors
+                       (e.g. ``SentenceTransformer.encode``)
+            max_batch_size: Maximum number of queries encoded in one call
+            max_wait_ms: Maximum time the first query of a batch waits for companions
+        """
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        # A single encoder thread: the model already uses all cores internally,
+        # overlapping batches would only add contention.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-batcher")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.encode_seconds = 0.0
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        return self._queue
+
+    async def encode(self, text: str) -> List[float]:
+        """
+        Encode a single text, sharing the model call with concurrent requests
+
+        Returns:
+            The embedding as a list of floats
+        """
+        queue = self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((text, future))
+        return await future
+
+    async def encode_many(self, texts: List[str]) -> List[List[float]]:
+        """
+        Encode a list of texts in a single model call (e.g. a batch request)
+
+        Runs on the same encoder thread as the micro-batches; identical texts are
+        encoded once.
+
+        Returns:
+            One embedding per text, in order
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        if not unique_texts:
+            return []
+        loop = asyncio.get_running_loop()
+        vectors = await loop.run_in_executor(self._executor, self._encode_batch, unique_texts)
+
+        self.batches += 1
+        self.items += len(texts)
+        self.max_batch_seen = max(self.max_batch_seen, len(texts))
+
+        by_text = dict(zip(unique_texts, vectors))
+        return [by_text[text] for text in texts]
+
+    async def _collect_batch(self) -> List[Tuple[str, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        # Drain anything already queued without waiting any longer
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+        return batch
+
+    def _encode_batch(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        vectors = self.encode_fn(texts)
+        self.encode_seconds += time.perf_counter() - start
+        return [vector.tolist() if hasattr(vector, 'tolist') else list(vector) for vector in vectors]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+
+            # Identical texts in the same window are encoded once
+            unique_texts = list(dict.fromkeys(text for text, _ in batch))
+
+            try:
+                vectors = await loop.run_in_executor(self._executor, self._encode_batch, unique_texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            by_text = dict(zip(unique_texts, vectors))
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(by_text[text])
+
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return batch counters
+        """
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "queries": self.items,
+            "average_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.max_batch_seen,
+            "encode_seconds": round(self.encode_seconds, 3)
+        }
@@ -0,0 +1,252 @@
+import os
+import json
+import shutil
+from typing import Any, Dict, Iterable, Iterator, List
+
+import numpy as np
+
+
+STORE_DTYPES = ("float16", "int8")
+
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+FULL_VECTORS_FILE = "vectors_f32.npy"
+CHUNK_IDS_FILE = "chunk_ids.npy"
+PRODUCT_INDEX_FILE = "product_index.npy"
+PRODUCT_IDS_FILE = "product_ids.json"
+DOCUMENTS_FILE = "documents.jsonl"
+DOCUMENT_OFFSETS_FILE = "document_offsets.npy"
+
+# Fields read from the id tables rather than documents.jsonl
+ID_FIELDS = ("product_id", "chunk_id")
+
+
+def is_embedding_store(path: str) -> bool:
+    """
+    Return True if path is a directory written by write_embedding_store
+    """
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+
+def replace_directory(source: str, path: str) -> None:
+    """
+    Move the directory source to path, replacing the directory previously there
+
+    The previous files are unlinked rather than overwritten, so processes that
+    still have them memory-mapped keep reading the old data until they reopen
+    path; overwriting a mapped file in place crashes them with SIGBUS.
+    """
+    previous = None
+    if os.path.exists(path):
+        previous = f"{path}.old-{os.getpid()}"
+        shutil.rmtree(previous, ignore_errors=True)
+        os.replace(path, previous)
+    os.replace(source, path)
+    if previous is not None:
+        # Best effort: on Windows mapped files cannot be removed until released
+        shutil.rmtree(previous, ignore_errors=True)
+
+
+def quantize_int8(vectors: np.ndarray):
+    """
+    Symmetric per-row int8 quantization
+
+    Returns:
+        (int8 matrix, float32 per-row scales) such that vectors ~= matrix * scales[:, None]
+    """
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def write_embedding_store(path: str,
+                          documents: Iterable[Dict[str, Any]],
+                          dtype: str = "float16",
+                          keep_full_precision: bool = True,
+                          vector_field: str = "description_vector") -> int:
+    """
+    Write chunk documents to an on-disk embedding store
+
+    The files are written in place: path must not be a store opened by a running
+    process. Write to a new directory and swap it in with replace_directory.
+
+    Layout of the store directory:
+        vectors.npy        contiguous (rows, dim) float16 or int8 matrix of L2-normalized vectors
+        scales.npy         per-row float32 scales (int8 only)
+        vectors_f32.npy    full-precision copy used to re-score the final top-k (optional)
+        chunk_ids.npy      int32 chunk_id of every row
+        product_index.npy  int32 offset of every row into product_ids.json
+        product_ids.json   distinct product ids
+        documents.jsonl    remaining chunk fields (no vectors or ids), one line per row
+        document_offsets.npy  int64 byte offset of every line, plus the file size
+        meta.json          format description
+
+    Args:
+        path: Output directory
+        documents: Chunk documents containing vector_field
+        dtype: "float16" or "int8"
+        keep_full_precision: Also write the float32 matrix for re-scoring
+        vector_field: Name of the embedding field
+
+    Returns:
+        Number of rows written
+    """
+    if dtype not in STORE_DTYPES:
+        raise ValueError(f"Unsupported store dtype: {dtype} (expected one of {STORE_DTYPES})")
+
+    os.makedirs(path, exist_ok=True)
+
+    vectors, chunk_ids, product_index, product_ids = [], [], [], {}
+    offsets = [0]
+    with open(os.path.join(path, DOCUMENTS_FILE), 'wb') as f:
+        for doc in documents:
+            vector = doc.get(vector_field)
+            if vector is None:
+                continue
+            vectors.append(np.asarray(vector, dtype=np.float32))
+            chunk_ids.append(doc.get('chunk_id', 0))
+            product_index.append(product_ids.setdefault(doc.get('product_id'), len(product_ids)))
+
+            fields = {key: value for key, value in doc.items() if key not in (vector_field, '_id') + ID_FIELDS}
+            line = (json.dumps(fields, ensure_ascii=False) + "\n").encode('utf-8')
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+
+    matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    if matrix.size:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms
+
+    if dtype == "int8":
+        quantized, scales = quantize_int8(matrix) if matrix.size else (matrix.astype(np.int8), np.zeros(0, np.float32))
+        np.save(os.path.join(path, VECTORS_FILE), quantized)
+        np.save(os.path.join(path, SCALES_FILE), scales)
+    else:
+        np.save(os.path.join(path, VECTORS_FILE), matrix.astype(np.float16))
+
+    full_path = os.path.join(path, FULL_VECTORS_FILE)
+    if keep_full_precision:
+        np.save(full_path, matrix.astype(np.float32))
+    elif os.path.exists(full_path):
+        os.remove(full_path)
+
+    np.save(os.path.join(path, DOCUMENT_OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+    np.save(os.path.join(path, CHUNK_IDS_FILE), np.asarray(chunk_ids, dtype=np.int32))
+    np.save(os.path.join(path, PRODUCT_INDEX_FILE), np.asarray(product_index, dtype=np.int32))
+    with open(os.path.join(path, PRODUCT_IDS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(list(product_ids), f, ensure_ascii=False)
+
+    with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            "format_version": 2,
+            "dtype": dtype,
+            "rows": int(matrix.shape[0]),
+            "dim": int(matrix.shape[1]) if matrix.size else 0,
+            "normalized": True,
+            "full_precision": keep_full_precision
+        }, f)
+
+    return int(matrix.shape[0])
+
+
+class EmbeddingStore:
+    """
+    Read-only view of an embedding store
+
+    Matrices, id tables and the document lines are memory-mapped so that several
+    worker processes share the operating system's page cache instead of each
+    holding its own copy.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open the store directory written by write_embedding_store
+        """
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        self.path = path
+        self.dtype = self.meta["dtype"]
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode='r')
+        self.scales = np.load(os.path.join(path, SCALES_FILE)) if self.dtype == "int8" else None
+
+        full_path = os.path.join(path, FULL_VECTORS_FILE)
+        self.full_vectors = np.load(full_path, mmap_mode='r') if os.path.exists(full_path) else None
+
+        self.chunk_ids = np.load(os.path.join(path, CHUNK_IDS_FILE), mmap_mode='r')
+        self.product_index = np.load(os.path.join(path, PRODUCT_INDEX_FILE), mmap_mode='r')
+        with open(os.path.join(path, PRODUCT_IDS_FILE), 'r', encoding='utf-8') as f:
+            self.product_ids: List[Any] = json.load(f)
+
+        documents_path = os.path.join(path, DOCUMENTS_FILE)
+        self.lines = (np.memmap(documents_path, dtype=np.uint8, mode='r')
+                      if os.path.getsize(documents_path) else np.zeros(0, dtype=np.uint8))
+        offsets_path = os.path.join(path, DOCUMENT_OFFSETS_FILE)
+        if os.path.exists(offsets_path):
+            self.offsets = np.load(offsets_path, mmap_mode='r')
+        else:
+            # format_version 1 stores: locate the lines once
+            ends = np.flatnonzero(self.lines == ord("\n")) + 1
+            self.offsets = np.concatenate([[0], ends]).astype(np.int64)
+
+    def __len__(self) -> int:
+        return int(self.vectors.shape[0])
+
+    def product_id(self, row: int) -> Any:
+        return self.product_ids[int(self.product_index[row])]
+
+    def chunk_id(self, row: int) -> int:
+        return int(self.chunk_ids[row])
+
+    def document(self, row: int) -> Dict[str, Any]:
+        """
+        Non-vector chunk fields of a row, parsed from its line of documents.jsonl
+        """
+        line = bytes(self.lines[self.offsets[row]:self.offsets[row + 1]])
+        document = json.loads(line.decode('utf-8'))
+        document.update(product_id=self.product_id(row), chunk_id=self.chunk_id(row))
+        return document
+
+    def documents(self) -> "StoreDocuments":
+        """
+        Sequence of the chunk documents, read on access
+        """
+        return StoreDocuments(self)
+
+
+class StoreDocuments:
+    """
+    Chunk documents of an EmbeddingStore, read row by row on access
+
+    Only the rows returned by a search are parsed; product_id and chunk_id
+    columns come straight from the id tables, so no per-chunk Python objects
+    are held in memory.
+    """
+
+    def __init__(self, store: EmbeddingStore):
+        self.store = store
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getitem__(self, row: int) -> Dict[str, Any]:
+        if not -len(self) <= row < len(self):
+            raise IndexError(row)
+        return self.store.document(row % len(self))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in range(len(self)):
+            yield self.store.document(row)
+
+    def column(self, field: str) -> List[Any]:
+        """
+        Values of field for every row
+        """
+        if field == "product_id":
+            return [self.store.product_ids[index] for index in self.store.product_index]
+        if field == "chunk_id":
+            return self.store.chunk_ids.tolist()
+        return [document.get(field) for document in self]
@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import argparse
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+DEFAULT_MODEL_NAME = "bkai-foundation-models/vietnamese-bi-encoder"
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_int8.onnx"
+
+# Queries used by the agreement check and the latency benchmark
+SAMPLE_SENTENCES = [
+    "sữa rửa mặt cho da dầu",
+    "kem chống nắng SPF 50",
+    "serum vitamin C chống lão hóa",
+    "mặt nạ dưỡng ẩm ban đêm",
+    "toner cho da nhạy cảm",
+    "laptop Asus mỏng nhẹ cho sinh viên",
+    "tai nghe bluetooth chống ồn",
+    "nồi chiên không dầu dung tích lớn",
+]
+
+
+def load_sentence_transformer(model_name: str, snapshot_path: Optional[str] = None, device: Optional[str] = None):
+    """
+    Load a SentenceTransformer, preferring a pre-serialized local snapshot
+
+    If snapshot_path points to a saved model it is loaded directly from disk
+    (no hub resolution or download); otherwise the model is loaded by name and,
+    when snapshot_path is set, saved there for the next start.
+
+    Args:
+        model_name: Hugging Face model name
+        snapshot_path: Directory of a model saved with SentenceTransformer.save
+        device: Torch device, e.g. "cpu" (default: automatic)
+    """
+    # Imported here: importing sentence_transformers pulls in torch and
+    # transformers, which alone takes seconds
+    from sentence_transformers import SentenceTransformer
+
+    if snapshot_path and os.path.isdir(snapshot_path) and os.listdir(snapshot_path):
+        return SentenceTransformer(snapshot_path, device=device)
+
+    model = SentenceTransformer(model_name, device=device)
+    if snapshot_path:
+        model.save(snapshot_path)
+        print(f"Saved model snapshot to {snapshot_path}")
+    return model
+
+
+class OnnxEncoder:
+    """
+    Sentence encoder running an exported transformer with ONNX Runtime
+
+    Reproduces SentenceTransformer.encode (tokenization, pooling and optional
+    normalization read from the saved model directory) without PyTorch, and can
+    use the int8 dynamically-quantized graph written by export_onnx.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = False, threads: Optional[int] = None):
+        """
+        Load the exported model
+
+        Args:
+            model_dir: Directory written by export_onnx
+            quantized: Use the int8 graph instead of the fp32 one
+            threads: ONNX Runtime intra-op threads (default: runtime choice)
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found, run: python encoders.py export --onnx-path {model_dir}")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        self.max_seq_length = self._read_json(model_dir, "sentence_bert_config.json").get("max_seq_length", 256)
+        pooling = self._read_json(os.path.join(model_dir, "1_Pooling"), "config.json")
+        if pooling.get("pooling_mode_cls_token"):
+            self.pooling = "cls"
+        elif pooling.get("pooling_mode_max_tokens"):
+            self.pooling = "max"
+        else:
+            self.pooling = "mean"
+        modules = self._read_json(model_dir, "modules.json", default=[])
+        self.normalize = any(module.get("type", "").endswith("Normalize") for module in modules)
+
+    @staticmethod
+    def _read_json(directory: str, name: str, default: Any = None) -> Any:
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            return {} if default is None else default
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "cls":
+            return hidden[:, 0]
+        mask = mask[:, :, None].astype(np.float32)
+        if self.pooling == "max":
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """
+        Encode one sentence (1-D result) or a list of sentences (2-D result)
+        """
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        outputs = []
+        for start in range(0, len(sentences), batch_size):
+            tokens = self.tokenizer(sentences[start:start + batch_size], padding=True, truncation=True,
+                                    max_length=self.max_seq_length, return_tensors="np")
+            feed = {name: value.astype(np.int64) for name, value in tokens.items() if name in self.input_names}
+            hidden = self.session.run(None, feed)[0]
+            outputs.append(self._pool(hidden, tokens["attention_mask"]))
+
+        embeddings = np.vstack(outputs).astype(np.float32) if outputs else np.zeros((0, 0), dtype=np.float32)
+        if self.normalize:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
+
+
+def encoder_config_from_env() -> Dict[str, Any]:
+    """
+    load_encoder arguments from ENCODER_BACKEND, MODEL_NAME, MODEL_SNAPSHOT_PATH,
+    ONNX_MODEL_PATH and ONNX_QUANTIZED
+
+    Shared by the API and load_data.py so that query and chunk vectors always
+    come from the same model.
+    """
+    return {
+        "backend": os.getenv('ENCODER_BACKEND', 'torch'),
+        "model_name": os.getenv('MODEL_NAME', DEFAULT_MODEL_NAME),
+        "snapshot_path": os.getenv('MODEL_SNAPSHOT_PATH') or None,
+        "onnx_path": os.getenv('ONNX_MODEL_PATH', 'models/onnx'),
+        "quantized": os.getenv('ONNX_QUANTIZED', 'false').lower() == 'true'
+    }
+
+
+def load_encoder(backend: str = "torch",
+                 model_name: str = DEFAULT_MODEL_NAME,
+                 snapshot_path: Optional[str] = None,
+                 onnx_path: Optional[str] = None,
+                 quantized: bool = False,
+                 threads: Optional[int] = None):
+    """
+    Load the query/chunk encoder selected by configuration
+
+    Args:
+        backend: "torch" (SentenceTransformer) or "onnx" (OnnxEncoder)
+        model_name: Hugging Face model name (torch backend)
+        snapshot_path: Local SentenceTransformer snapshot (torch backend)
+        onnx_path: Directory written by export_onnx (onnx backend)
+        quantized: Use the int8 ONNX graph
+        threads: Intra-op threads (torch.set_num_threads for the torch backend)
+
+    Returns:
+        An object with a SentenceTransformer-compatible ``encode`` method
+    """
+    if backend == "onnx":
+        return OnnxEncoder(onnx_path, quantized=quantized, threads=threads)
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return load_sentence_transformer(model_name, snapshot_path=snapshot_path)
+    raise ValueError(f"Unknown encoder backend: {backend}")
+
+
+def export_onnx(model_name: str, output_dir: str, snapshot_path: Optional[str] = None,
+                quantize: bool = True, opset: int = 14) -> None:
+    """
+    Export the transformer of a SentenceTransformer to ONNX (and an int8 copy)
+
+    The SentenceTransformer is saved to output_dir first so that the tokenizer,
+    max_seq_length and pooling configuration travel with the graph.
+    """
+    import torch
+
+    model = load_sentence_transformer(model_name, snapshot_path=snapshot_path, device="cpu")
+    model.save(output_dir)
+
+    transformer = model[0].auto_model.eval()
+    transformer.config.return_dict = False
+    sample = model.tokenizer(["xin chào"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+
+    path = os.path.join(output_dir, ONNX_FILE)
+    with torch.no_grad():
+        torch.onnx.export(transformer, tuple(sample[name] for name in input_names), path,
+                          input_names=input_names, output_names=["last_hidden_state"],
+                          dynamic_axes=dynamic_axes, opset_version=opset)
+    print(f"Exported {path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = os.path.join(output_dir, ONNX_INT8_FILE)
+        quantize_dynamic(path, int8_path, weight_type=QuantType.QInt8)
+        print(f"Wrote dynamically-quantized {int8_path}")
+
+
+def cosine_agreement(reference, candidate, sentences: List[str]) -> Dict[str, float]:
+    """
+    Cosine similarity between the embeddings of two encoders for the same sentences
+    """
+    a = np.asarray(reference.encode(sentences), dtype=np.float32)
+    b = np.asarray(candidate.encode(sentences), dtype=np.float32)
+    cosines = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return {"min_cosine": float(cosines.min()), "mean_cosine": float(cosines.mean())}
+
+
+def benchmark_latency(encoder, sentences: List[str], repeats: int = 20) -> Dict[str, float]:
+    """
+    Per-query latency (one sentence per encode call, as in /search)
+    """
+    encoder.encode(sentences[0])  # Warm-up
+    latencies = []
+    for _ in range(repeats):
+        for sentence in sentences:
+            start = time.perf_counter()
+            encoder.encode(sentence)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "queries": len(latencies),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 2)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export, check and benchmark the ONNX encoder backend")
+    parser.add_argument("command", choices=["export", "check", "benchmark"])
+    parser.add_argument("--model-name", default=os.getenv('MODEL_NAME', DEFAULT_MODEL_NAME))
+    parser.add_argument("--snapshot", default=os.getenv('MODEL_SNAPSHOT_PATH') or None,
+                        help="Local SentenceTransformer snapshot directory")
+    parser.add_argument("--onnx-path", default=os.getenv('ONNX_MODEL_PATH', 'models/onnx'),
+                        help="Directory of the exported ONNX model (default: models/onnx)")
+    parser.add_argument("--no-quantize", action="store_true", help="Export: skip the int8 graph")
+    parser.add_argument("--tolerance", type=float, default=0.99,
+                        help="Check: minimum cosine similarity to the PyTorch embeddings (default: 0.99)")
+    parser.add_argument("--repeats", type=int, default=20, help="Benchmark: passes over the sample queries")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx(args.model_name, args.onnx_path, snapshot_path=args.snapshot, quantize=not args.no_quantize)
+    else:
+        reference = load_encoder("torch", args.model_name, snapshot_path=args.snapshot)
+        candidates = {"onnx-fp32": OnnxEncoder(args.onnx_path)}
+        if os.path.exists(os.path.join(args.onnx_path, ONNX_INT8_FILE)):
+            candidates["onnx-int8"] = OnnxEncoder(args.onnx_path, quantized=True)
+
+        if args.command == "check":
+            failed = False
+            for name, encoder in candidates.items():
+                agreement = cosine_agreement(reference, encoder, SAMPLE_SENTENCES)
+                passed = agreement["min_cosine"] >= args.tolerance
+                failed = failed or not passed
+                print(f"{name}: min cosine {agreement['min_cosine']:.5f}, mean {agreement['mean_cosine']:.5f} "
+                      f"-> {'OK' if passed else 'FAIL'} (tolerance {args.tolerance})")
+            raise SystemExit(1 if failed else 0)
+
+        for name, encoder in [("torch", reference)] + list(candidates.items()):
+            print(f"{name}: {benchmark_latency(encoder, SAMPLE_SENTENCES, repeats=args.repeats)}")
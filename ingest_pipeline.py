@@ -0,0 +1,296 @@
+import os
+import json
+import queue
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO
+
+import numpy as np
+
+from text_chunker import TextChunker, build_product_documents, embed_documents, encode_texts
+from encoders import load_encoder
+
+
+# Marks the end of a stage's output in its queue
+_DONE = object()
+
+# Characters that can follow a complete scalar element of a JSON array
+_SCALAR_DELIMITERS = frozenset(" \t\r\n,]")
+
+
+def iter_json_array(f: TextIO, read_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Yield the elements of a top-level JSON array one by one without loading the whole file
+
+    Args:
+        f: Text file positioned at the start of the array
+        read_size: Number of characters read from the file at a time
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def fill() -> None:
+        nonlocal buffer, pos, eof
+        data = f.read(read_size)
+        if not data:
+            eof = True
+        buffer, pos = buffer[pos:] + data, 0
+
+    def skip_whitespace() -> bool:
+        """Advance past whitespace; return False at end of file"""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return True
+            if eof:
+                return False
+            fill()
+
+    if not skip_whitespace():
+        return
+    if buffer[pos] != '[':
+        raise ValueError("Expected a JSON array of products")
+    pos += 1
+
+    while True:
+        if not skip_whitespace():
+            raise ValueError("Unterminated JSON array")
+        if buffer[pos] == ']':
+            return
+        if buffer[pos] == ',':
+            pos += 1
+            continue
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()  # The element continues past the end of the buffer
+            continue
+
+        if not eof and not isinstance(item, (dict, list, str)) and (
+                end == len(buffer) or buffer[end] not in _SCALAR_DELIMITERS):
+            # A number may continue in the next read ("1" + "2345", "1." + "25"): only
+            # accept a scalar once the delimiter that follows it has been read
+            fill()
+            continue
+
+        yield item
+        pos = end
+
+
+def iter_products(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream products from a JSON array file or a JSON Lines file (.jsonl)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from iter_json_array(f)
+
+
+def prefetch(iterable: Iterable[Any], maxsize: int = 4, name: str = "stage") -> Iterator[Any]:
+    """
+    Run an iterable in a background thread, handing items over through a bounded queue
+
+    The producer blocks once ``maxsize`` items are waiting, so a fast stage can
+    never run ahead of a slow one by more than the queue size. Exceptions are
+    re-raised in the consuming thread.
+    """
+    items: "queue.Queue" = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    error: List[BaseException] = []
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        items.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except BaseException as e:
+            error.append(e)
+        finally:
+            while not stop.is_set():
+                try:
+                    items.put(_DONE, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    thread = threading.Thread(target=produce, name=f"ingest-{name}", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                break
+            yield item
+        if error:
+            raise error[0]
+    finally:
+        stop.set()
+
+
+def chunk_windows(products: Iterable[Dict[str, Any]],
+                  chunker: TextChunker,
+                  window_chunks: int = 2048,
+                  transform: Optional[Callable[[Dict[str, Any], List[Dict[str, Any]]], None]] = None
+                  ) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Chunk products and group their documents into windows of about window_chunks chunks
+
+    A product's chunks never straddle two windows, so every window can be
+    written independently.
+
+    Args:
+        products: Product dictionaries
+        chunker: TextChunker used for the descriptions
+        window_chunks: Number of chunks after which a window is emitted
+        transform: Optional callback(product, documents) to annotate the documents
+    """
+    window: List[Dict[str, Any]] = []
+    for product in products:
+        documents = build_product_documents(product, chunker)
+        if transform is not None:
+            transform(product, documents)
+        window.extend(documents)
+        if len(window) >= window_chunks:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def encode_windows(windows: Iterable[List[Dict[str, Any]]],
+                   model,
+                   batch_size: int = 128) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Add embeddings to every window of chunk documents (length-sorted batches within a window)
+    """
+    for window in windows:
+        embed_documents(window, model, batch_size=batch_size, verbose=False)
+        yield window
+
+
+# Model loaded once per encoder worker process by _init_encoder_worker
+_worker_model = None
+
+
+def _init_encoder_worker(encoder_config: Dict[str, Any], threads: int) -> None:
+    global _worker_model
+    _worker_model = load_encoder(threads=threads, **encoder_config)
+
+
+def _encode_in_worker(texts: List[str], batch_size: int) -> np.ndarray:
+    vectors = encode_texts(texts, _worker_model, batch_size=batch_size, verbose=False)
+    return np.vstack(vectors).astype(np.float32) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+
+def parallel_encode_windows(windows: Iterable[List[Dict[str, Any]]],
+                            encoder_config: Dict[str, Any],
+                            workers: int,
+                            batch_size: int = 128,
+                            torch_threads: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Encode windows of chunk documents in a pool of encoder processes
+
+    Each worker loads its own encoder and limits it to
+    ``torch_threads`` intra-op threads (default: CPU count / workers) so the processes
+    do not oversubscribe the cores. Only the chunk texts are sent to the
+    workers and a float32 matrix comes back; at most two windows per worker
+    are in flight, and windows are yielded in input order.
+
+    Args:
+        windows: Windows of chunk documents (e.g. from chunk_windows)
+        encoder_config: Keyword arguments for encoders.load_encoder
+        workers: Number of encoder processes
+        batch_size: Number of chunk texts encoded per model call
+        torch_threads: Intra-op threads per worker (torch or ONNX Runtime)
+    """
+    if torch_threads is None:
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    # "spawn" gives every worker a clean torch runtime (and is the only option on Windows)
+    context = multiprocessing.get_context("spawn")
+    pending: deque = deque()
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_encoder_worker,
+                             initargs=(encoder_config, torch_threads)) as executor:
+        def finish_oldest() -> List[Dict[str, Any]]:
+            window, future = pending.popleft()
+            for doc, vector in zip(window, future.result()):
+                doc['description_vector'] = vector.tolist()
+            return window
+
+        for window in windows:
+            texts = [doc['chunk_text'] or '' for doc in window]
+            pending.append((window, executor.submit(_encode_in_worker, texts, batch_size)))
+            if len(pending) >= workers * 2:
+                yield finish_oldest()
+
+        while pending:
+            yield finish_oldest()
+
+
+def streaming_pipeline(products: Iterable[Dict[str, Any]],
+                       model=None,
+                       chunk_size: int = 300,
+                       overlap: int = 50,
+                       batch_size: int = 128,
+                       window_chunks: int = 2048,
+                       queue_size: int = 4,
+                       transform: Optional[Callable[[Dict[str, Any], List[Dict[str, Any]]], None]] = None,
+                       workers: int = 0,
+                       encoder_config: Optional[Dict[str, Any]] = None,
+                       torch_threads: Optional[int] = None
+                       ) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Reader -> chunker -> encoder pipeline with bounded queues between the stages
+
+    Each stage runs in its own thread; the caller consumes embedded windows
+    (typically writing them to MongoDB) while the next ones are being read,
+    chunked and encoded. At most ``queue_size`` items wait between two stages,
+    so memory stays flat regardless of catalog size.
+
+    With ``workers`` > 0 the encoder stage is a pool of processes (see
+    parallel_encode_windows) instead of ``model`` in a thread.
+
+    Args:
+        products: Product iterator (e.g. iter_products(path))
+        model: Encoder for creating embeddings (workers == 0), see encoders.load_encoder
+        chunk_size: Maximum characters per chunk
+        overlap: Overlap between chunks
+        batch_size: Number of chunk texts encoded per model call
+        window_chunks: Approximate number of chunks per window
+        queue_size: Maximum number of items waiting between two stages
+        transform: Optional callback(product, documents) run by the chunker stage
+        workers: Number of encoder processes, 0 to encode in this process
+        encoder_config: load_encoder arguments for each encoder process (workers > 0)
+        torch_threads: Intra-op threads per encoder process (workers > 0)
+
+    Yields:
+        Lists of chunk documents with description_vector, grouped by whole products
+    """
+    chunker = TextChunker(chunk_size=chunk_size, overlap=overlap)
+    products = prefetch(products, maxsize=queue_size * 256, name="reader")
+    windows = prefetch(chunk_windows(products, chunker, window_chunks, transform), maxsize=queue_size, name="chunker")
+    if workers > 0:
+        encoded = parallel_encode_windows(windows, encoder_config, workers, batch_size, torch_threads)
+    else:
+        encoded = encode_windows(windows, model, batch_size)
+    yield from prefetch(encoded, maxsize=queue_size, name="encoder")
@@ -0,0 +1,344 @@
+import os
+import re
+import json
+import heapq
+import shutil
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, TextIO
+
+import numpy as np
+
+from product_catalog import FILTER_FIELDS
+from embedding_store import replace_directory
+from search_backend import ChunkFilter
+
+META_FILE = "meta.json"
+POSTINGS_FILE = "postings.npz"
+DOCUMENTS_FILE = "documents.jsonl"
+
+# Chunk fields kept in the index: returned with results and used by filters
+DOCUMENT_FIELDS = ["product_id", "chunk_text", "chunk_id", "is_chunk"] + FILTER_FIELDS
+
+# Words, model numbers and SKUs such as "xps-13", "1.500.000" or "sm-a556e"
+WORD_PATTERN = re.compile(r"[0-9a-z]+(?:[-./][0-9a-z]+)*")
+PART_PATTERN = re.compile(r"[a-z]+|[0-9]+")
+# Specifications rather than model numbers: number and unit ("16gb", "500ml",
+# "5000mah") or rating and number ("spf50", "ip68", "ddr5")
+SPEC_PATTERN = re.compile(r"[0-9]+(?:k|m|cm|mm|g|kg|mg|ml|l|gb|tb|mb|w|mah|hz|inch)"
+                          r"|(?:spf|pa|ip|ddr|lpddr|usb|wifi)[0-9]+")
+
+
+def _strip_diacritics(text: str) -> str:
+    text = unicodedata.normalize('NFD', text.replace('đ', 'd').replace('Đ', 'D'))
+    return "".join(char for char in text if unicodedata.category(char) != 'Mn')
+
+
+# Latin letters with diacritics (Latin-1 to Latin Extended Additional, which holds
+# the precomposed Vietnamese letters) mapped to their base letters
+_FOLD_TABLE = {code: _strip_diacritics(chr(code)) for code in range(0x00C0, 0x1EFF + 1)
+               if _strip_diacritics(chr(code)) != chr(code)}
+
+
+def fold(text: str) -> str:
+    """
+    Lowercase and strip Vietnamese diacritics ("Sữa rửa mặt" -> "sua rua mat")
+
+    Users often type without diacritics, so documents and queries are both
+    folded; syllable bigrams (see tokenize) keep most of the lost precision.
+    """
+    text = unicodedata.normalize('NFC', text.lower()).translate(_FOLD_TABLE)
+    # Combining marks left over from characters outside the table
+    return _strip_diacritics(text) if not text.isascii() else text
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Terms of a text: folded syllables, bigrams of adjacent syllables and model-number variants
+
+    Vietnamese words are written as space-separated syllables ("rửa mặt"), so a
+    bigram term ``rua_mat`` is added for every pair of adjacent words. A token
+    mixing letters, digits or separators ("RTX4060", "XPS-13") is indexed as a
+    whole without separators ("rtx4060", "xps13") and as its parts.
+    """
+    if not text:
+        return []
+    terms, words = [], []
+    for word in WORD_PATTERN.findall(fold(text)):
+        parts = None if word.isalpha() or word.isdigit() else PART_PATTERN.findall(word)
+        if parts and len(parts) > 1:
+            word = "".join(parts)
+            terms.append(word)
+            terms.extend(parts)
+        else:
+            terms.append(word)
+        words.append(word)
+    terms.extend(f"{first}_{second}" for first, second in zip(words, words[1:]))
+    return terms
+
+
+def sku_terms(query: str, max_words: int = 4) -> List[str]:
+    """
+    Model numbers or SKUs of a short query, as indexed ("Dell XPS-13" -> ["xps13"])
+
+    Only words mixing letters and digits count: bare numbers ("tivi 2024",
+    "laptop 15000000") and specifications ("ram 16gb", "kem spf50") are not model numbers.
+    """
+    words = WORD_PATTERN.findall(fold(query))
+    if len(words) > max_words:
+        return []
+    terms = []
+    for word in words:
+        parts = PART_PATTERN.findall(word)
+        term = "".join(parts)
+        if (any(part.isalpha() for part in parts) and any(part.isdigit() for part in parts)
+                and not SPEC_PATTERN.fullmatch(term)):
+            terms.append(term)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: Dict[str, List[Dict[str, Any]]], limit: int, k: int = 60,
+                           key: str = "product_id") -> List[Dict[str, Any]]:
+    """
+    Merge named ranked result lists with reciprocal rank fusion
+
+    Every item gets sum(1 / (k + rank)) over the lists it appears in. ``score``
+    is that sum divided by its maximum (first in every list), so it lies in
+    (0, 1] and decreases down the results; the score an item had in list
+    ``name`` is kept as ``<name>_score`` (None when absent from that list).
+    The row of the first list containing an item supplies the other fields.
+    """
+    fused: Dict[Any, list] = {}
+    for name, ranking in rankings.items():
+        for rank, row in enumerate(ranking, 1):
+            entry = fused.get(row[key])
+            if entry is None:
+                fused[row[key]] = entry = [0.0, row, {}]
+            entry[0] += 1.0 / (k + rank)
+            entry[2][f"{name}_score"] = row.get("score")
+    best_possible = len(rankings) / (k + 1)
+    results = []
+    for fusion, row, scores in heapq.nlargest(limit, fused.values(), key=lambda entry: entry[0]):
+        row = dict(row, score=fusion / best_possible)
+        row.update({f"{name}_score": scores.get(f"{name}_score") for name in rankings})
+        results.append(row)
+    return results
+
+
+def is_lexical_index(path: str) -> bool:
+    """
+    Return True if path is a directory written by LexicalIndex.save
+    """
+    return bool(path) and os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+
+class _PostingsBuilder:
+    """
+    Accumulates (term, document, tf) postings in flat typed arrays
+
+    About 12 bytes per posting instead of a Python tuple per posting, so
+    building the index of a large catalog stays within a small multiple of the
+    final file size.
+    """
+
+    def __init__(self):
+        self.terms: Dict[str, int] = {}
+        self.term_ids = array('i')
+        self.docs = array('i')
+        self.tfs = array('f')
+        self.doc_lengths = array('f')
+
+    def add(self, chunk: Dict[str, Any], names: Dict[Any, str], name_weight: int) -> None:
+        doc_id = len(self.doc_lengths)
+        counts = Counter(tokenize(chunk.get('chunk_text') or ''))
+        for term in tokenize(names.get(chunk.get('product_id')) or ''):
+            counts[term] += name_weight
+        self.doc_lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            self.term_ids.append(self.terms.setdefault(term, len(self.terms)))
+            self.docs.append(doc_id)
+            self.tfs.append(tf)
+
+    def finish(self):
+        """
+        Return (terms, offsets, docs, tfs, doc_lengths) with postings grouped by term
+        """
+        term_ids = np.frombuffer(self.term_ids, dtype=np.int32)
+        # Stable: documents stay in increasing order within each term
+        order = np.argsort(term_ids, kind='stable')
+        offsets = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(term_ids, minlength=len(self.terms)))
+        docs = np.frombuffer(self.docs, dtype=np.int32)[order]
+        tfs = np.frombuffer(self.tfs, dtype=np.float32)[order]
+        doc_lengths = np.frombuffer(self.doc_lengths, dtype=np.float32).copy()
+        return list(self.terms), offsets, docs, tfs, doc_lengths
+
+
+def _write_document(f: TextIO, chunk: Dict[str, Any]) -> Dict[str, Any]:
+    document = {field: chunk.get(field) for field in DOCUMENT_FIELDS if field in chunk}
+    f.write(json.dumps(document, ensure_ascii=False, default=str) + "\n")
+    return document
+
+
+def _write_postings(path: str, offsets, docs, tfs, doc_lengths, terms: List[str], k1: float, b: float) -> None:
+    np.savez(os.path.join(path, POSTINGS_FILE), offsets=offsets, docs=docs, tfs=tfs, doc_lengths=doc_lengths)
+    with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({"format_version": 1, "k1": k1, "b": b, "documents": len(doc_lengths), "terms": terms},
+                  f, ensure_ascii=False)
+
+
+def _temp_directory(path: str) -> str:
+    temp_path = f"{os.path.normpath(path)}.tmp-{os.getpid()}"
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    return temp_path
+
+
+def write_lexical_index(chunks: Iterable[Dict[str, Any]], path: str, names: Optional[Dict[Any, str]] = None,
+                        name_weight: int = 2, k1: float = 1.2, b: float = 0.75) -> Dict[str, int]:
+    """
+    Build the index of a chunk stream straight to a directory, as LexicalIndex.save would write it
+
+    Chunks are written to documents.jsonl as they arrive and only their postings
+    are kept in memory, in flat arrays. The directory is built beside path and
+    swapped in at the end, so an API loading the index meanwhile reads the
+    previous one in full.
+
+    Returns:
+        {"documents": ..., "terms": ...}
+    """
+    names = names or {}
+    builder = _PostingsBuilder()
+    temp_path = _temp_directory(path)
+    with open(os.path.join(temp_path, DOCUMENTS_FILE), 'w', encoding='utf-8') as f:
+        for chunk in chunks:
+            _write_document(f, chunk)
+            builder.add(chunk, names, name_weight)
+    terms, offsets, docs, tfs, doc_lengths = builder.finish()
+    _write_postings(temp_path, offsets, docs, tfs, doc_lengths, terms, k1, b)
+    replace_directory(temp_path, path)
+    return {"documents": len(doc_lengths), "terms": len(terms)}
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk texts and product names
+
+    Every chunk is one document made of its text and the name of its product
+    (counted ``name_weight`` times). Postings are stored as flat arrays: the
+    documents and term frequencies of term ``t`` are
+    ``docs[offsets[t]:offsets[t + 1]]`` and ``tfs[...]``.
+    """
+
+    def __init__(self, terms: List[str], offsets: np.ndarray, docs: np.ndarray, tfs: np.ndarray,
+                 doc_lengths: np.ndarray, documents: List[Dict[str, Any]],
+                 k1: float = 1.2, b: float = 0.75):
+        self.terms = {term: term_id for term_id, term in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+
+        count = len(documents)
+        average_length = float(doc_lengths.mean()) if count else 0.0
+        document_frequency = np.diff(offsets)
+        self.idf = np.log(1.0 + (count - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        # Length normalization of the BM25 denominator, per document
+        self.norms = (k1 * (1 - b + b * doc_lengths / max(average_length, 1e-9))).astype(np.float32)
+        self._filter = ChunkFilter(documents)
+
+    @classmethod
+    def build(cls, chunks: Iterable[Dict[str, Any]], names: Optional[Dict[Any, str]] = None,
+              name_weight: int = 2, **kwargs) -> "LexicalIndex":
+        """
+        Index chunk documents, adding the product name of each chunk from names
+        """
+        names = names or {}
+        builder = _PostingsBuilder()
+        documents = []
+        for chunk in chunks:
+            documents.append({field: chunk.get(field) for field in DOCUMENT_FIELDS if field in chunk})
+            builder.add(chunk, names, name_weight)
+        terms, offsets, docs, tfs, doc_lengths = builder.finish()
+        return cls(terms, offsets, docs, tfs, doc_lengths, documents, **kwargs)
+
+    def save(self, path: str) -> None:
+        """
+        Write the index to a directory (meta.json, postings.npz, documents.jsonl), replacing it atomically
+        """
+        temp_path = _temp_directory(path)
+        with open(os.path.join(temp_path, DOCUMENTS_FILE), 'w', encoding='utf-8') as f:
+            for document in self.documents:
+                _write_document(f, document)
+        _write_postings(temp_path, self.offsets, self.docs, self.tfs, self.doc_lengths, list(self.terms),
+                        self.k1, self.b)
+        replace_directory(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        postings = np.load(os.path.join(path, POSTINGS_FILE))
+        documents = []
+        with open(os.path.join(path, DOCUMENTS_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    documents.append(json.loads(line))
+        return cls(meta["terms"], postings["offsets"], postings["docs"], postings["tfs"], postings["doc_lengths"],
+                   documents, k1=meta["k1"], b=meta["b"])
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def has_terms(self, product_id: Any, terms: List[str]) -> bool:
+        """
+        Return True if every term occurs in a chunk or the name of product_id
+        """
+        for term in terms:
+            term_id = self.terms.get(term)
+            if term_id is None:
+                return False
+            docs = self.docs[self.offsets[term_id]:self.offsets[term_id + 1]]
+            if not any(self.documents[int(doc_id)].get('product_id') == product_id for doc_id in docs):
+                return False
+        return True
+
+    def search(self, query: str, limit: int, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Best chunks for query by BM25, in the shape of SearchBackend.search results
+
+        ``score`` is the BM25 score divided by the best one (in (0, 1]), so the
+        results can go through aggregate_search_results like vector results.
+        """
+        term_ids = {self.terms[term] for term in tokenize(query) if term in self.terms}
+        if not term_ids or limit <= 0:
+            return []
+
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs, tfs = self.docs[start:end], self.tfs[start:end]
+            # Each document appears once per posting list, so fancy-index accumulation is safe
+            scores[docs] += self.idf[term_id] * tfs * (self.k1 + 1) / (tfs + self.norms[docs])
+        if filters:
+            scores[~self._filter.mask(filters)] = 0
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        matched = matched[np.argsort(-scores[matched], kind='stable')]
+
+        best = float(scores[matched[0]])
+        results = []
+        for doc_id in matched:
+            result = dict(self.documents[int(doc_id)])
+            result["score"] = float(scores[doc_id]) / best
+            results.append(result)
+        return results
@@ -1,82 +1,394 @@
 import os
 import json
-from pymongo import MongoClient
-from sentence_transformers import SentenceTransformer
+import time
+import shutil
+import hashlib
+import argparse
+import itertools
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from text_chunker import process_products_with_chunking
-def load_and_process_data():
+from ingest_pipeline import iter_products, streaming_pipeline
+from search_backend import VECTOR_FIELD, save_chunk_documents, vector_index_definition
+from embedding_store import replace_directory, write_embedding_store
+from database import (create_mongo_client, get_metadata_collection, get_products_collection,
+                      compute_chunk_stats, save_chunk_stats, bump_data_version)
+from product_catalog import FILTER_FIELDS, build_product_metadata, filter_values, products_path_for, save_products
+from pymongo import ReplaceOne, UpdateMany
+from bulk_writer import BulkWriter
+from encoders import encoder_config_from_env, load_encoder
+from lexical_index import write_lexical_index
+
+DATA_PATH = 'data/products_data.json'
+CHECKPOINT_PATH = 'data/.ingest_checkpoint.json'
+CHUNK_SIZE = 300  # Adjust based on your needs
+OVERLAP = 50      # Overlap between chunks
+
+
+def _hash(payload: Any) -> str:
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def encoder_model_key(encoder_config: Dict[str, Any]) -> str:
+    """
+    Identity of the encoder producing the chunk vectors, hashed into product fingerprints
+
+    The ONNX backend and its int8 graph produce (slightly) different vectors than
+    the torch model, so switching them re-embeds every product; the torch key is
+    the bare model name, as in fingerprints written before the ONNX backend existed.
+    """
+    key = encoder_config["model_name"]
+    if encoder_config.get("backend", "torch") != "torch":
+        key += f"|{encoder_config['backend']}"
+        if encoder_config.get("quantized"):
+            key += "|int8"
+    return key
+
+
+def product_fingerprint(product: Dict[str, Any], chunk_size: int, overlap: int, model_name: str) -> str:
+    """
+    Hash of everything that determines a product's chunk documents
+
+    Chunks only hold the description (or the name for products without one),
+    so only those fields are hashed together with the chunking parameters and
+    the embedding model (see encoder_model_key); a price or rating change does
+    not re-embed the product.
+    """
+    return _hash({
+        "product_id": product.get('data_product'),
+        "descriptioninfo": product.get('descriptioninfo'),
+        "name": product.get('name'),
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "model": model_name
+    })
+
+
+def metadata_fingerprint(metadata: Dict[str, Any]) -> str:
+    """
+    Hash of a product metadata document (see product_catalog.build_product_metadata)
+
+    The list of filter fields copied into the chunks is hashed too, so changing
+    it refreshes the chunk filter fields of every product without re-embedding.
+    """
+    return _hash({"metadata": metadata, "filter_fields": FILTER_FIELDS})
+
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable checkpoint {path}: {e}")
+        return {}
+
+
+def save_checkpoint(path: str, state: Dict[str, Any]) -> None:
+    # Write to a temporary file first so a crash never leaves a truncated checkpoint
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+
+def get_existing_fingerprints(products_collection) -> Dict[Any, Tuple[Optional[str], Optional[str]]]:
+    """
+    Return the (chunk fingerprint, metadata fingerprint) stored for every product
+    """
+    return {
+        doc["_id"]: (doc.get("fingerprint"), doc.get("metadata_fingerprint"))
+        for doc in products_collection.find({}, {"fingerprint": 1, "metadata_fingerprint": 1})
+    }
+
+
+def write_products(products_collection, documents: List[Dict[str, Any]]) -> None:
+    """
+    Upsert product metadata documents (keyed by product_id)
+    """
+    if documents:
+        products_collection.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in documents],
+                                       ordered=False)
+
+
+def write_chunk_filters(collection, documents: List[Dict[str, Any]]) -> None:
+    """
+    Copy the filter fields of product metadata documents into their existing chunks
+    """
+    if documents:
+        collection.bulk_write([UpdateMany({"product_id": doc["_id"]}, {"$set": filter_values(doc)})
+                               for doc in documents], ordered=False)
+
+
+def write_product_chunks(collection, writer: BulkWriter, product_ids: List[Any], documents: List[Dict[str, Any]]) -> int:
+    """
+    Replace the chunks of the given products with the new chunk documents
+
+    Returns:
+        Number of documents that could not be inserted
+    """
+    collection.delete_many({"product_id": {"$in": product_ids}})
+    return writer.write(documents)
+
+
+def export_local_index(collection, products_collection, path: str, index_format: str) -> None:
+    """
+    Export the chunk collection and the product metadata for the local (in-process) search backend
+    """
+    documents = collection.find({}, {"_id": 0})
+    products = products_collection.find({}, {"fingerprint": 0, "metadata_fingerprint": 0})
+    if index_format == 'jsonl':
+        count = save_chunk_documents(documents, path)
+        product_count = save_products(products, products_path_for(path))
+    else:
+        # Memory-mappable float16/int8 matrix + id table (keeps float32 copy for re-scoring).
+        # Running APIs have the current store mapped: build a new directory and swap it in
+        temp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        count = write_embedding_store(temp_path, documents, dtype=index_format)
+        product_count = save_products(products, os.path.join(temp_path, "products.jsonl"))
+        replace_directory(temp_path, path)
+    products_path = products_path_for(path)
+    print(f"Exported {count} chunk documents to {path} ({index_format}) and {product_count} products "
+          f"to {products_path} for the local search backend.")
+
+
+def export_lexical_index(collection, products_collection, path: str) -> None:
+    """
+    Build the BM25 index over chunk texts and product names used by the API's lexical search
+    """
+    names = {doc["_id"]: doc.get("name") for doc in products_collection.find({}, {"name": 1})}
+    chunks = collection.find({}, {"_id": 0, VECTOR_FIELD: 0})
+    start_time = time.perf_counter()
+    # Streamed: chunk texts go straight to disk, only the postings are held (as flat arrays)
+    counts = write_lexical_index(chunks, path, names)
+    print(f"Built lexical index of {counts['documents']} chunks ({counts['terms']} terms) in "
+          f"{time.perf_counter() - start_time:.1f}s: {path}")
+
+
+def load_and_process_data(full_reload: bool = False,
+                          window_chunks: int = 2048,
+                          encode_batch_size: int = 128,
+                          encode_workers: int = 0,
+                          torch_threads: Optional[int] = None,
+                          write_batch_bytes: int = 4 * 1024 * 1024,
+                          write_concurrency: int = 4,
+                          write_retries: int = 5,
+                          checkpoint_path: str = CHECKPOINT_PATH):
     """
     Load product data, create chunks, generate embeddings, and store in MongoDB
+
+    Products are streamed from the data file (JSON array or JSON Lines) through
+    a reader -> chunker -> encoder pipeline with bounded queues, so memory stays
+    flat and inserts start as soon as the first window is encoded.
+
+    Only new or changed products (by fingerprint) are re-chunked and re-embedded;
+    chunks of products no longer in the data file are deleted. Products are
+    written window by window, so the collection is never empty during a reload,
+    and a checkpoint lets an interrupted run resume where it stopped.
+
+    Chunk documents carry the product_id, the chunk fields and the filter
+    fields used to pre-filter the vector search; the rest of the product
+    metadata is stored once per product in the products collection. Products
+    whose metadata changed but whose description did not are upserted there and
+    get their chunk filter fields updated in place, without re-embedding.
+
+    Args:
+        full_reload: Re-embed every product even if its fingerprint is unchanged
+        window_chunks: Approximate number of chunks encoded and written together
+        encode_batch_size: Number of chunk texts encoded per model call
+        encode_workers: Number of encoder processes (0 encodes in this process)
+        torch_threads: Torch threads per encoder process (default: CPU count / workers)
+        write_batch_bytes: Maximum BSON size of one bulk insert
+        write_concurrency: Number of bulk inserts in flight at once
+        write_retries: Retries per bulk insert on transient errors
+        checkpoint_path: File recording the window currently being written
     """
-    
+
     # Load environment variables
     load_dotenv()
-    MONGO_USER = os.getenv('MONGO_USER')
-    MONGO_PASS = os.getenv('MONGO_PASS')
-    MONGO_HOST = os.getenv('MONGO_HOST')
     MONGO_DB = os.getenv('MONGO_DB')
     MONGO_COLLECTION = os.getenv('MONGO_COLLECTION')
-    
+    LOCAL_INDEX_PATH = os.getenv('LOCAL_INDEX_PATH', '')
+    # Encoder used for the chunks, configured like the API's query encoder (see encoders.py)
+    encoder_config = encoder_config_from_env()
+    model_key = encoder_model_key(encoder_config)
+    LOCAL_INDEX_FORMAT = os.getenv('LOCAL_INDEX_FORMAT', 'jsonl')  # jsonl, float16 or int8
+    LEXICAL_INDEX_PATH = os.getenv('LEXICAL_INDEX_PATH', 'data/lexical_index')
+
     # Connect to MongoDB
-    uri = f"mongodb+srv://{MONGO_USER}:{MONGO_PASS}@{MONGO_HOST}/?retryWrites=true&w=majority"
     try:
-        client = MongoClient(uri)
+        client = create_mongo_client()
         db = client[MONGO_DB]
-        
+
         # Use a new collection for chunked data
         collection = db[f"{MONGO_COLLECTION}"]
+        # Product metadata, stored once per product
+        products_collection = get_products_collection(db, MONGO_COLLECTION)
         print("Successfully connected to MongoDB Atlas.")
     except Exception as e:
         print(f"Failed to connect to MongoDB: {e}")
         return
-    # Load the sentence transformer model
-    print("Loading sentence-transformer model...")
-    model = SentenceTransformer("bkai-foundation-models/vietnamese-bi-encoder")
-    print("Model loaded successfully.")
-    
-    # Load product data
-    print("Loading product data...")
-    with open('data/products_data.json', 'r', encoding='utf-8') as f:
-        products = json.load(f)
-    print(f"Loaded {len(products)} products.")
-    
-    # Process products with chunking
-    print("Processing products with chunking...")
-    chunked_documents = process_products_with_chunking(
-        products=products,
-        model=model,
-        chunk_size=300,  # Adjust based on your needs
-        overlap=50       # Overlap between chunks
-    )
-    
-    # Clear existing data
-    print("Clearing existing chunked data...")
-    collection.delete_many({})
-    
-    # Insert chunked documents
-    print(f"Inserting {len(chunked_documents)} chunked documents...")
-    batch_size = 100
-    
-    for i in range(0, len(chunked_documents), batch_size):
-        batch = chunked_documents[i:i + batch_size]
-        try:
-            collection.insert_many(batch)
-            print(f"Inserted batch {i//batch_size + 1}/{(len(chunked_documents) + batch_size - 1)//batch_size}")
-        except Exception as e:
-            print(f"Error inserting batch: {e}")
-    
-    print("Data processing and insertion completed!")
-    
-    # Create index for vector search (if not exists)
+
+    # Create indexes first: product_id is used to replace chunks product by product
     try:
         # Note: You'll need to create the vector search index manually in MongoDB Atlas
         # This is just a regular index for other fields
         collection.create_index([("product_id", 1)])
-        collection.create_index([("name", "text")])
+        products_collection.create_index([("name", "text")])
         print("Indexes created successfully.")
     except Exception as e:
         print(f"Note: {e}")
-    
+
+    # Fingerprints currently stored with the products, to detect changed products
+    existing = get_existing_fingerprints(products_collection)
+
+    checkpoint = load_checkpoint(checkpoint_path)
+    interrupted = set(checkpoint.get("in_progress", [])) | set(checkpoint.get("failed", []))
+    if interrupted:
+        print(f"Resuming: re-processing {len(interrupted)} products of an unfinished window or failed inserts.")
+
+    # Stream product data (the catalog is never held in memory)
+    print(f"Streaming product data from {DATA_PATH}...")
+    fingerprints: Dict[Any, str] = {}
+    # Metadata of re-embedded products, upserted once their chunks are written
+    pending_products: Dict[Any, Dict[str, Any]] = {}
+    metadata_updates: deque = deque()
+
+    # A product listed more than once is loaded from its last occurrence only (the one that
+    # used to overwrite the others): queueing every copy would re-embed it on each run
+    last_occurrence = {product.get('data_product'): position
+                       for position, product in enumerate(iter_products(DATA_PATH))}
+
+    def changed_products():
+        metadata_only = []
+        for position, product in enumerate(iter_products(DATA_PATH)):
+            product_id = product.get('data_product')
+            if last_occurrence[product_id] != position:
+                continue
+            fingerprint = product_fingerprint(product, CHUNK_SIZE, OVERLAP, model_key)
+            metadata = build_product_metadata(product)
+            metadata.update(fingerprint=fingerprint, metadata_fingerprint=metadata_fingerprint(metadata))
+            fingerprints[product_id] = fingerprint
+
+            old_fingerprint, old_metadata_fingerprint = existing.get(product_id, (None, None))
+            if full_reload or old_fingerprint != fingerprint or product_id in interrupted:
+                pending_products[product_id] = metadata
+                yield product
+            elif old_metadata_fingerprint != metadata['metadata_fingerprint']:
+                # Same chunks: only the products collection needs the new metadata
+                metadata_only.append(metadata)
+                if len(metadata_only) >= 1000:
+                    write_products(products_collection, metadata_only)
+                    write_chunk_filters(collection, metadata_only)
+                    metadata_updates.append(len(metadata_only))
+                    metadata_only = []
+        write_products(products_collection, metadata_only)
+        write_chunk_filters(collection, metadata_only)
+        metadata_updates.append(len(metadata_only))
+
+    products = changed_products()
+    first_product = next(products, None)
+    total_chunks, total_products = 0, 0
+    failed_products = set()
+    writer = BulkWriter(collection, max_batch_bytes=write_batch_bytes,
+                        concurrency=write_concurrency, max_retries=write_retries)
+
+    if first_product is not None:
+        model = None
+        if encode_workers > 0:
+            print(f"Starting {encode_workers} encoder processes...")
+        else:
+            # Load the sentence transformer model
+            print(f"Loading sentence-transformer model ({encoder_config['backend']} backend)...")
+            model = load_encoder(**encoder_config)
+            print("Model loaded successfully.")
+
+        # Reader -> chunker -> encoder run in background threads; this thread writes
+        windows = streaming_pipeline(
+            itertools.chain([first_product], products),
+            model=model,
+            chunk_size=CHUNK_SIZE,
+            overlap=OVERLAP,
+            batch_size=encode_batch_size,
+            window_chunks=window_chunks,
+            workers=encode_workers,
+            encoder_config=encoder_config,
+            torch_threads=torch_threads
+        )
+
+        start_time = time.perf_counter()
+        for window_number, chunked_documents in enumerate(windows, 1):
+            product_ids = list(dict.fromkeys(doc['product_id'] for doc in chunked_documents))
+            for doc in chunked_documents:
+                # Filter fields (price, brand, ...) of the product for $vectorSearch pre-filtering
+                doc.update(filter_values(pending_products[doc['product_id']]))
+
+            save_checkpoint(checkpoint_path, {"in_progress": product_ids, "failed": sorted(failed_products, key=str)})
+            if write_product_chunks(collection, writer, product_ids, chunked_documents):
+                # Products with missing chunks are re-processed by the next run
+                failed_products.update(doc.get('product_id') for doc, _ in writer.failed)
+            # Product documents carry the fingerprint, so they are only written for complete products
+            written = [pending_products.pop(product_id) for product_id in product_ids]
+            write_products(products_collection, [doc for doc in written if doc['_id'] not in failed_products])
+            save_checkpoint(checkpoint_path, {"in_progress": [], "failed": sorted(failed_products, key=str)})
+
+            total_chunks += len(chunked_documents)
+            total_products += len(product_ids)
+            elapsed = time.perf_counter() - start_time
+            print(f"Wrote window {window_number}: {total_products} products, {total_chunks} chunks "
+                  f"({total_chunks / elapsed:.1f} chunks/sec)")
+
+    print(f"{total_products} new or changed products, {sum(metadata_updates)} with metadata changes only, "
+          f"{len(fingerprints) - total_products - sum(metadata_updates)} unchanged.")
+
+    # Delete chunks and metadata of products that are no longer in the data file
+    removed = [product_id for product_id in existing if product_id not in fingerprints]
+    if removed:
+        result = collection.delete_many({"product_id": {"$in": removed}})
+        products_collection.delete_many({"_id": {"$in": removed}})
+        print(f"Deleted {result.deleted_count} chunks of {len(removed)} removed products.")
+    elif not existing and fingerprints:
+        # First run with a products collection: drop chunks left over from products no longer in the file
+        result = collection.delete_many({"product_id": {"$nin": list(fingerprints)}})
+        if result.deleted_count:
+            print(f"Deleted {result.deleted_count} chunks of products no longer in the data file.")
+
+    writer.close()
+    report = writer.report()
+    print(f"Bulk writes: {report['inserted']} documents in {report['batches']} batches "
+          f"({report['megabytes_written']} MB, {report['retries']} retries, {report['failed']} failed).")
+    if report['failed']:
+        for failure in report['failed_documents'][:20]:
+            print(f"  Failed: product {failure['product_id']} chunk {failure['chunk_id']}: {failure['error']}")
+        print(f"{len(failed_products)} products with failed inserts are kept in {checkpoint_path} "
+              f"and will be re-processed by the next run.")
+    elif os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    print("Data processing and insertion completed!")
+
+    # Precompute the statistics served by /info (refreshed on every load)
+    metadata_collection = get_metadata_collection(db, MONGO_COLLECTION)
+    stats = compute_chunk_stats(collection)
+    save_chunk_stats(metadata_collection, stats)
+    print(f"Saved chunk statistics: {stats.get('total_chunks', 0)} chunks, "
+          f"{stats.get('unique_products', 0)} products.")
+
+    # Export chunk documents for the local (in-process) search backend
+    if LOCAL_INDEX_PATH:
+        export_local_index(collection, products_collection, LOCAL_INDEX_PATH, LOCAL_INDEX_FORMAT)
+
+    # Inverted index for the lexical fast path and hybrid ranking of /search
+    if LEXICAL_INDEX_PATH:
+        export_lexical_index(collection, products_collection, LEXICAL_INDEX_PATH)
+
+    # New version stamp (after the exports, which running APIs reload): they drop
+    # their cached product metadata and reload the lexical index on their next poll
+    print(f"Published data version {bump_data_version(metadata_collection)}.")
+
     print("\n" + "="*50)
     print("IMPORTANT: Vector Search Index Setup")
     print("="*50)
@@ -84,21 +396,39 @@ def load_and_process_data():
     print("1. Go to your MongoDB Atlas cluster")
     print("2. Navigate to Search -> Create Search Index")
     print("3. Choose 'JSON Editor' and use this configuration:")
-    print("""
-{
-  "fields": [
-    {
-      "numDimensions": 768,
-      "path": "description_vector",
-      "similarity": "cosine",
-      "type": "vector"
-    }
-  ]
-}
-    """)
+    print("   (the 'filter' fields enable the price/brand/category/rating filters of /search)")
+    print(json.dumps(vector_index_definition(), indent=2))
     print(f"4. Name the index: 'vector_search_chunked'")
     print(f"5. Apply to collection: '{MONGO_COLLECTION}'")
     print("="*50)
 
 if __name__ == "__main__":
-    load_and_process_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load products into MongoDB with chunking and embeddings")
+    parser.add_argument("--full", action="store_true",
+                        help="Re-embed every product instead of only new or changed ones")
+    parser.add_argument("--window-chunks", type=int, default=2048,
+                        help="Approximate number of chunks encoded and written together (default: 2048)")
+    parser.add_argument("--encode-batch-size", type=int, default=128,
+                        help="Chunk texts encoded per model call (default: 128)")
+    parser.add_argument("--encode-workers", type=int, default=0,
+                        help="Number of encoder processes, each with its own model (default: 0, encode in-process)")
+    parser.add_argument("--torch-threads", type=int, default=None,
+                        help="Torch threads per encoder process (default: CPU count / encode workers)")
+    parser.add_argument("--write-batch-mb", type=float, default=4,
+                        help="Maximum size of one bulk insert in MB (default: 4)")
+    parser.add_argument("--write-concurrency", type=int, default=4,
+                        help="Number of bulk inserts in flight at once (default: 4)")
+    parser.add_argument("--write-retries", type=int, default=5,
+                        help="Retries per bulk insert on transient errors (default: 5)")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH,
+                        help=f"Checkpoint file used to resume an interrupted run (default: {CHECKPOINT_PATH})")
+    args = parser.parse_args()
+
+    load_and_process_data(full_reload=args.full, window_chunks=args.window_chunks,
+                          encode_batch_size=args.encode_batch_size,
+                          encode_workers=args.encode_workers,
+                          torch_threads=args.torch_threads,
+                          write_batch_bytes=int(args.write_batch_mb * 1024 * 1024),
+                          write_concurrency=args.write_concurrency,
+                          write_retries=args.write_retries,
+                          checkpoint_path=args.checkpoint)
@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import itertools
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+ENDPOINTS = {"search": "/search", "search-chunks": "/search-chunks"}
+
+
+def load_query_log(path: str) -> List[Dict[str, Any]]:
+    """
+    Read a JSONL query log: one SearchRequest per line ({"text", "limit", "chunk_limit", filters...})
+
+    Lines may also be plain JSON strings, and may carry an "endpoint" field
+    ("search" or "search-chunks") to mix both endpoints in one replay.
+    """
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            queries.append({"text": item} if isinstance(item, str) else item)
+    return queries
+
+
+class LoadResult:
+    """
+    Latencies and status codes collected per endpoint during a replay
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.outcomes: Dict[str, Counter] = {}
+
+    def record(self, endpoint: str, latency: float, outcome: str) -> None:
+        self.latencies.setdefault(endpoint, []).append(latency)
+        self.outcomes.setdefault(endpoint, Counter())[outcome] += 1
+
+    @staticmethod
+    def _summary(latencies: List[float], outcomes: Counter, elapsed: float) -> Dict[str, Any]:
+        values = np.asarray(latencies, dtype=np.float64) * 1000
+        errors = sum(count for outcome, count in outcomes.items() if outcome != "200")
+        return {
+            "requests": len(latencies),
+            "throughput_per_second": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+            "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+            "outcomes": dict(outcomes),
+            **{f"p{q}_ms": round(float(np.percentile(values, q)), 2) if len(values) else None
+               for q in (50, 90, 95, 99)},
+            "max_ms": round(float(values.max()), 2) if len(values) else None
+        }
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        all_latencies = [latency for latencies in self.latencies.values() for latency in latencies]
+        all_outcomes = sum(self.outcomes.values(), Counter())
+        return {
+            "seconds": round(elapsed, 3),
+            "total": self._summary(all_latencies, all_outcomes, elapsed),
+            "endpoints": {endpoint: self._summary(latencies, self.outcomes[endpoint], elapsed)
+                          for endpoint, latencies in self.latencies.items()}
+        }
+
+
+async def replay(client, queries: Iterator[Dict[str, Any]], default_endpoint: str,
+                 concurrency: int, rate: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Send the queries and measure each response
+
+    Without rate, ``concurrency`` workers send requests back to back (closed
+    loop). With rate, requests are started on a fixed schedule of ``rate`` per
+    second with at most ``concurrency`` in flight, and latency is measured from
+    the scheduled start so that queueing behind a slow server is not hidden.
+    """
+    result = LoadResult()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(item: Dict[str, Any], scheduled: float) -> None:
+        endpoint = item.get("endpoint", default_endpoint)
+        body = {key: value for key, value in item.items() if key not in ("endpoint", "id")}
+        try:
+            response = await client.post(ENDPOINTS[endpoint], json=body)
+            outcome = str(response.status_code)
+        except Exception as e:
+            outcome = type(e).__name__
+        finally:
+            semaphore.release()
+        result.record(endpoint, time.perf_counter() - scheduled, outcome)
+
+    start = time.perf_counter()
+    tasks = []
+    for index, item in enumerate(queries):
+        scheduled = time.perf_counter()
+        if rate:
+            scheduled = start + index / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await semaphore.acquire()
+        tasks.append(asyncio.create_task(send(item, scheduled)))
+    await asyncio.gather(*tasks)
+    return result.report(time.perf_counter() - start)
+
+
+def iter_requests(queries: List[Dict[str, Any]], requests: Optional[int], limit: Optional[int],
+                  chunk_limit: Optional[int]) -> Iterator[Dict[str, Any]]:
+    """
+    Cycle through the log until ``requests`` requests were produced (one pass when None)
+    """
+    source = itertools.cycle(queries) if requests else iter(queries)
+    for item in itertools.islice(source, requests):
+        item = dict(item)
+        if limit is not None:
+            item.setdefault("limit", limit)
+        if chunk_limit is not None:
+            item.setdefault("chunk_limit", chunk_limit)
+        yield item
+
+
+async def run_in_process(main, queries: Iterator[Dict[str, Any]], args) -> Dict[str, Any]:
+    """
+    Replay against the FastAPI app through an in-process ASGI transport
+    """
+    import httpx
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=args.timeout) as client:
+            if args.warmup:
+                await replay(client, iter_requests(args.queries_list, args.warmup, args.limit, args.chunk_limit),
+                             args.endpoint, args.concurrency)
+            return await replay(client, queries, args.endpoint, args.concurrency, args.rate)
+
+
+async def run_against_server(url: str, queries: Iterator[Dict[str, Any]], args) -> Dict[str, Any]:
+    """
+    Replay against a running server (e.g. uvicorn started with SEARCH_BACKEND=local)
+    """
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        if args.warmup:
+            await replay(client, iter_requests(args.queries_list, args.warmup, args.limit, args.chunk_limit),
+                         args.endpoint, args.concurrency)
+        return await replay(client, queries, args.endpoint, args.concurrency, args.rate)
+
+
+def load_configured_encoder():
+    """
+    The query encoder the API would load (ENCODER_BACKEND, MODEL_NAME, ...)
+    """
+    from encoders import encoder_config_from_env, load_encoder
+
+    return load_encoder(**encoder_config_from_env())
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    for name, summary in [("total", report["total"])] + list(report["endpoints"].items()):
+        print(f"{name:<14} {summary['requests']:>7} req  {summary['throughput_per_second']:>9.1f} req/s  "
+              f"p50 {summary['p50_ms']:.1f}  p90 {summary['p90_ms']:.1f}  p95 {summary['p95_ms']:.1f}  "
+              f"p99 {summary['p99_ms']:.1f}  max {summary['max_ms']:.1f} ms  "
+              f"errors {summary['error_rate']:.2%} {summary['outcomes']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a query log against the search API and report latency")
+    parser.add_argument("log", nargs="?", default=None,
+                        help="JSONL query log (SearchRequest per line); synthetic queries when omitted")
+    parser.add_argument("--url", default=None,
+                        help="Running API to load (default: in-process app with the local backend)")
+    parser.add_argument("--index", default=os.getenv('LOCAL_INDEX_PATH') or None,
+                        help="In-process: local index exported by load_data.py (default: LOCAL_INDEX_PATH)")
+    parser.add_argument("--lexical-index", default=os.getenv('LEXICAL_INDEX_PATH', 'data/lexical_index'),
+                        help="In-process with --index: lexical index built by load_data.py (default: LEXICAL_INDEX_PATH)")
+    parser.add_argument("--synthetic-products", type=int, default=2000,
+                        help="In-process without --index: size of a generated catalog (default: 2000)")
+    parser.add_argument("--stub-encoder", action="store_true",
+                        help="In-process: deterministic hashing encoder instead of the transformer "
+                             "(for queries and the synthetic index)")
+    parser.add_argument("--endpoint", default="search", choices=sorted(ENDPOINTS),
+                        help="Endpoint of log lines without an \"endpoint\" field (default: search)")
+    parser.add_argument("--requests", type=int, default=None,
+                        help="Number of requests, cycling through the log (default: one pass)")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Target requests per second (default: as fast as --concurrency allows)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight (default: 16)")
+    parser.add_argument("--warmup", type=int, default=20, help="Requests sent before measuring (default: 20)")
+    parser.add_argument("--limit", type=int, default=None, help="Products per query when not set in the log")
+    parser.add_argument("--chunk-limit", type=int, default=None, help="Chunks per query when not set in the log")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--output", default=None, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    if args.log:
+        args.queries_list = load_query_log(args.log)
+    else:
+        from benchmark_suite import generate_queries
+        args.queries_list = [{"text": text} for text in generate_queries(args.requests or 500)]
+    queries = iter_requests(args.queries_list, args.requests, args.limit, args.chunk_limit)
+
+    if args.url:
+        report = asyncio.run(run_against_server(args.url, queries, args))
+    else:
+        from benchmark_suite import (StubEncoder, generate_catalog, load_offline_app,
+                                     process_products_with_chunking, write_offline_index)
+
+        encoder = StubEncoder() if args.stub_encoder else None
+        with tempfile.TemporaryDirectory() as work_dir:
+            index_path, lexical_index_path = args.index, args.lexical_index
+            if not index_path:
+                # Documents and queries must be encoded by the same model for meaningful rankings
+                if encoder is None:
+                    encoder = load_configured_encoder()
+                print(f"Building a synthetic local index of {args.synthetic_products} products...")
+                products = generate_catalog(args.synthetic_products)
+                documents = process_products_with_chunking(products, encoder)
+                index_path = write_offline_index(work_dir, documents, products)
+                lexical_index_path = os.path.join(work_dir, "lexical_index")
+            main = load_offline_app(index_path, encoder, lexical_index_path=lexical_index_path)
+            report = asyncio.run(run_in_process(main, queries, args))
+
+    report["parameters"] = {key: value for key, value in vars(args).items() if key != "queries_list"}
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Saved {args.output}")
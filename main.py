@@ -1,45 +1,301 @@
 import os
+import json
+import asyncio
+import tempfile
+from collections import deque
+from contextlib import asynccontextmanager
 import uvicorn
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from pymongo import MongoClient
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import AsyncIterator, List, Literal, Optional
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-from text_chunker import aggregate_search_results
-import torch
+from text_chunker import aggregate_search_results, build_product_scorer
+from cache import (EmbeddingCache, BackgroundRefresher, create_response_cache, normalize_query,
+                   response_cache_key)
+from embedding_scheduler import EmbeddingBatcher
+from database import (create_mongo_client, DatabaseExecutor, get_metadata_collection, get_products_collection,
+                      load_chunk_stats, load_data_version)
+from product_catalog import CachedProductCatalog
+from search_backend import build_search_filter, create_search_backend, SEARCH_FIELDS
+from encoders import encoder_config_from_env, load_encoder
+from lexical_index import LexicalIndex, is_lexical_index, reciprocal_rank_fusion, sku_terms
+from metrics import MetricsRegistry, MetricsMiddleware, StageTimer
+from startup import StartupState
 
 # --- KHỞI TẠO ---
 
 # 1. Tải các biến môi trường
 load_dotenv()
-MONGO_USER = os.getenv('MONGO_USER')
-MONGO_PASS = os.getenv('MONGO_PASS')
-MONGO_HOST = os.getenv('MONGO_HOST')
+STARTUP_MODE = os.getenv('STARTUP_MODE', 'lazy')  # "lazy": mở port ngay, tải model ở background; "eager"
+# Model embedding (MODEL_NAME, ENCODER_BACKEND "torch"/"onnx", ...): cùng cấu hình với load_data.py
+ENCODER_CONFIG = encoder_config_from_env()
 MONGO_DB = os.getenv('MONGO_DB')
 MONGO_COLLECTION = os.getenv('MONGO_COLLECTION')
+MONGO_EXECUTOR_WORKERS = int(os.getenv('MONGO_EXECUTOR_WORKERS', 16))
+MONGO_QUERY_TIMEOUT_MS = int(os.getenv('MONGO_QUERY_TIMEOUT_MS', 15000))
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'atlas')  # "atlas" hoặc "local"
+VECTOR_INDEX_NAME = os.getenv('VECTOR_INDEX_NAME', 'vector_search_chunked')
+LOCAL_INDEX_PATH = os.getenv('LOCAL_INDEX_PATH', '')
+LOCAL_INDEX_MODE = os.getenv('LOCAL_INDEX_MODE', 'exact')  # "exact", "ivf" hoặc "hnsw"
+LOCAL_INDEX_RESCORE_FACTOR = int(os.getenv('LOCAL_INDEX_RESCORE_FACTOR', 4))
+INFO_REFRESH_SECONDS = float(os.getenv('INFO_REFRESH_SECONDS', 300))
+PRODUCT_CACHE_SIZE = int(os.getenv('PRODUCT_CACHE_SIZE', 10000))
+PRODUCT_CACHE_TTL = float(os.getenv('PRODUCT_CACHE_TTL', 3600))
+DATA_VERSION_POLL_SECONDS = float(os.getenv('DATA_VERSION_POLL_SECONDS', 30))
+PRODUCT_SCORING = os.getenv('PRODUCT_SCORING', 'max')  # Điểm sản phẩm từ các chunk: "max", "sum_top_n" hoặc "softmax"
+PRODUCT_SCORING_TOP_N = int(os.getenv('PRODUCT_SCORING_TOP_N', 3))
+PRODUCT_SCORING_TEMPERATURE = float(os.getenv('PRODUCT_SCORING_TEMPERATURE', 0.1))
+# Kiểm tra cấu hình scoring ngay khi khởi động thay vì lỗi ở mỗi truy vấn (ví dụ temperature = 0)
+build_product_scorer(PRODUCT_SCORING, PRODUCT_SCORING_TOP_N, PRODUCT_SCORING_TEMPERATURE)
+# "python": gộp chunk thành sản phẩm trong API; "server": gộp bằng $group trong MongoDB (chỉ hỗ trợ scoring "max")
+SEARCH_AGGREGATION = os.getenv('SEARCH_AGGREGATION', 'python')
+if SEARCH_AGGREGATION == 'server' and PRODUCT_SCORING != 'max':
+    print(f"⚠️ SEARCH_AGGREGATION=server chỉ hỗ trợ PRODUCT_SCORING=max, dùng gộp trong Python ({PRODUCT_SCORING}).")
+    SEARCH_AGGREGATION = 'python'
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', 1024))
+EMBEDDING_CACHE_TTL = float(os.getenv('EMBEDDING_CACHE_TTL', 3600))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv('EMBEDDING_BATCH_MAX_SIZE', 32))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv('EMBEDDING_BATCH_MAX_WAIT_MS', 5))
+BATCH_SEARCH_MAX_SIZE = int(os.getenv('BATCH_SEARCH_MAX_SIZE', 100))
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 32))  # Số truy vấn mỗi batch của /search/stream
+STREAM_MAX_IN_FLIGHT = int(os.getenv('STREAM_MAX_IN_FLIGHT', 2))  # Số batch được xử lý đồng thời
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'none')  # "none", "memory" hoặc "disk"
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1024))
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 300))
+RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', 'data/.response_cache.sqlite')
+# Tìm kiếm từ khóa (BM25, index do load_data.py tạo) và trộn hạng với kết quả vector
+LEXICAL_INDEX_PATH = os.getenv('LEXICAL_INDEX_PATH', 'data/lexical_index')
+SEARCH_MODE = os.getenv('SEARCH_MODE', 'hybrid')  # "vector", "lexical" hoặc "hybrid" (khi có index từ khóa)
+LEXICAL_FAST_PATH = os.getenv('LEXICAL_FAST_PATH', 'true').lower() == 'true'  # Truy vấn dạng mã model: chỉ dùng từ khóa
+RRF_K = int(os.getenv('RRF_K', 60))
+# Trả thời gian từng giai đoạn (encode, vector search, ...) trong header Server-Timing
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() == 'true'
 
-# 2. Kết nối đến MongoDB Atlas
-uri = f"mongodb+srv://{MONGO_USER}:{MONGO_PASS}@{MONGO_HOST}/?retryWrites=true&w=majority"
+# 2. Kết nối đến MongoDB Atlas (pool size và timeout cấu hình trong .env)
 try:
-    client = MongoClient(uri)
+    client = create_mongo_client()
     db = client[MONGO_DB]
     # Use the chunked collection
     collection = db[f"{MONGO_COLLECTION}"]
+    # Thống kê do load_data.py tính sẵn khi nạp dữ liệu
+    metadata_collection = get_metadata_collection(db, MONGO_COLLECTION)
+    # Thông tin sản phẩm (tên, giá, ...) lưu một lần cho mỗi sản phẩm, không lặp trong từng chunk
+    products_collection = get_products_collection(db, MONGO_COLLECTION)
     print("Successfully connected to MongoDB Atlas (collection).")
 except Exception as e:
     print(f"Failed to connect to MongoDB: {e}")
-    exit()
-# 3. Tải mô hình embedding (sẽ được cache sau lần chạy đầu)
-print("Loading sentence-transformer model...")
-model = SentenceTransformer("bkai-foundation-models/vietnamese-bi-encoder")
-print("Model loaded.")
+    if not (SEARCH_BACKEND == "local" and LOCAL_INDEX_PATH):
+        exit()
+    # Backend local đọc index từ file nên vẫn chạy được khi không có MongoDB
+    print("Continuing without MongoDB: using the local index file only.")
+    collection = metadata_collection = products_collection = None
+
+# Các lệnh PyMongo là blocking nên được chạy trong thread pool giới hạn,
+# tránh làm treo event loop của uvicorn
+db_executor = DatabaseExecutor(max_workers=MONGO_EXECUTOR_WORKERS)
+
+# Backend tìm kiếm và model được tải trong giai đoạn warm-up (xem lifespan)
+startup_state = StartupState()
+search_backend = None
+lexical_index = None
+model = None
+
+def load_info_stats() -> dict:
+    """
+    Đọc thống kê chunks: tính trong bộ nhớ với backend local, đọc document
+    metadata do load_data.py ghi với Atlas (chỉ quét cả collection nếu chưa có).
+    """
+    if search_backend.name == "local":
+        return search_backend.chunk_stats()
+    stats = load_chunk_stats(metadata_collection)
+    if stats is None:
+        print("No precomputed chunk statistics found, computing them from the collection...")
+        stats = search_backend.chunk_stats()
+    return stats
+
+# Bản sao thống kê trong bộ nhớ, được làm mới định kỳ ở background
+info_stats = BackgroundRefresher(load_info_stats, db_executor.run, interval=INFO_REFRESH_SECONDS)
+
+async def cached_response(endpoint: str, key: str):
+    """
+    Đọc cache kết quả; backend SQLite (I/O đĩa, có thể phải chờ khóa) chạy ngoài event loop.
+    """
+    if response_cache.blocking:
+        return await asyncio.to_thread(response_cache.get, endpoint, key)
+    return response_cache.get(endpoint, key)
+
+async def cache_response(endpoint: str, key: str, value) -> None:
+    if response_cache.blocking:
+        await asyncio.to_thread(response_cache.set, endpoint, key, value)
+    else:
+        response_cache.set(endpoint, key, value)
+
+def invalidate_caches():
+    """
+    Xóa các cache phụ thuộc dữ liệu khi load_data.py đã nạp dữ liệu mới.
+    """
+    if isinstance(search_backend.catalog, CachedProductCatalog):
+        search_backend.catalog.clear()
+    if response_cache is not None:
+        response_cache.clear()
+
+def check_data_version():
+    """
+    Đọc version dữ liệu do load_data.py ghi; khi version đổi thì nạp lại index local, index từ khóa và xóa cache.
+    """
+    global search_backend, lexical_index
+    version = load_data_version(metadata_collection)
+    if data_version.loaded_at is not None and version != data_version.value:
+        print(f"Data version changed ({data_version.value} -> {version}), clearing caches.")
+        # load_data.py đã xuất lại index local và index từ khóa trước khi ghi version mới;
+        # các request đang chạy vẫn dùng bản cũ cho đến khi xong
+        if SEARCH_BACKEND == 'local':
+            search_backend = load_search_backend()
+        lexical_index = load_lexical_index()
+        invalidate_caches()
+    return version
+
+# Theo dõi version dữ liệu (poll định kỳ collection metadata)
+data_version = BackgroundRefresher(check_data_version, db_executor.run, interval=DATA_VERSION_POLL_SECONDS)
+
+# 3. Warm-up: tải backend tìm kiếm và mô hình embedding (sẽ được cache sau lần chạy đầu)
+def load_lexical_index():
+    """
+    Đọc index từ khóa do load_data.py tạo (None nếu chưa có).
+    """
+    if not is_lexical_index(LEXICAL_INDEX_PATH):
+        return None
+    index = LexicalIndex.load(LEXICAL_INDEX_PATH)
+    print(f"Lexical index ready ({len(index)} chunks, {len(index.terms)} terms).")
+    return index
+
+def load_search_backend():
+    """
+    Backend tìm kiếm vector: Atlas $vectorSearch hoặc index chạy trong tiến trình.
+    """
+    backend = create_search_backend(
+        SEARCH_BACKEND,
+        collection=collection,
+        products_collection=products_collection,
+        index_name=VECTOR_INDEX_NAME,
+        max_time_ms=MONGO_QUERY_TIMEOUT_MS,
+        local_index_path=LOCAL_INDEX_PATH,
+        local_index_mode=LOCAL_INDEX_MODE,
+        rescore_factor=LOCAL_INDEX_RESCORE_FACTOR
+    )
+    if backend.catalog.reads_database and PRODUCT_CACHE_SIZE > 0:
+        # Thông tin sản phẩm ít thay đổi: cache trong bộ nhớ, không đọc lại MongoDB mỗi truy vấn
+        backend.catalog = CachedProductCatalog(backend.catalog, max_size=PRODUCT_CACHE_SIZE, ttl=PRODUCT_CACHE_TTL)
+    return backend
+
+def warm_up():
+    global search_backend, lexical_index, model
+    with startup_state.phase("search backend"):
+        search_backend = load_search_backend()
+    with startup_state.phase("lexical index"):
+        lexical_index = load_lexical_index()
+    with startup_state.phase("model load"):
+        model = load_encoder(**ENCODER_CONFIG)
+    with startup_state.phase("model warm-up"):
+        # Lần encode đầu tiên khởi tạo kernel/bộ nhớ, không để request đầu tiên phải chịu
+        model.encode(["khởi động"])
+
+async def run_warm_up():
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception as e:
+        startup_state.mark_failed(e)
+        return
+    startup_state.mark_ready()
+    info_stats.start()
+    if metadata_collection is not None:
+        data_version.start()
+
+# Cache vector của câu truy vấn, dùng chung cho /search và /search-chunks
+embedding_cache = EmbeddingCache(max_size=EMBEDDING_CACHE_SIZE, ttl=EMBEDDING_CACHE_TTL)
+
+# Cache toàn bộ kết quả /search và /search-chunks (khóa gồm cả version dữ liệu)
+response_cache = create_response_cache(RESPONSE_CACHE_BACKEND, max_size=RESPONSE_CACHE_SIZE,
+                                       ttl=RESPONSE_CACHE_TTL, path=RESPONSE_CACHE_PATH)
+
+# Gom các truy vấn đồng thời thành một lần gọi model.encode (chạy ngoài event loop)
+embedding_batcher = EmbeddingBatcher(
+    encode_fn=lambda texts: model.encode(texts, batch_size=len(texts)),
+    max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+    max_wait_ms=EMBEDDING_BATCH_MAX_WAIT_MS
+)
+
+# Metrics dạng Prometheus cho /metrics: số request, độ trễ theo endpoint và theo từng giai đoạn tìm kiếm
+metrics_registry = MetricsRegistry()
+requests_total = metrics_registry.counter("http_requests_total", "HTTP requests by route and status.",
+                                          ["method", "path", "status"])
+request_duration = metrics_registry.histogram("http_request_duration_seconds", "HTTP request latency by route.",
+                                              ["method", "path"])
+stage_timer = StageTimer(metrics_registry.histogram("search_stage_duration_seconds",
+                                                    "Latency of each search stage.", ["stage"]))
+
+async def encode_query(text: str) -> list:
+    """
+    Vector hóa câu truy vấn, bỏ qua model nếu câu truy vấn đã có trong cache.
+    Model encode đúng chuỗi đã chuẩn hóa dùng làm khóa cache.
+    """
+    text = normalize_query(text)
+    with stage_timer.stage("encode"):
+        query_vector = embedding_cache.get(text)
+        if query_vector is None:
+            query_vector = await embedding_batcher.encode(text)
+            embedding_cache.set(text, query_vector)
+    return query_vector
+
+async def encode_queries(texts: List[str]) -> List[list]:
+    """
+    Vector hóa nhiều câu truy vấn: các câu chưa có trong cache được encode trong một lần gọi model.
+    """
+    texts = [normalize_query(text) for text in texts]
+    with stage_timer.stage("encode"):
+        vectors = [embedding_cache.get(text) for text in texts]
+        missing = [text for text, vector in zip(texts, vectors) if vector is None]
+        if missing:
+            encoded = dict(zip(missing, await embedding_batcher.encode_many(missing)))
+            for text, vector in encoded.items():
+                embedding_cache.set(text, vector)
+            vectors = [vector if vector is not None else encoded[text] for text, vector in zip(texts, vectors)]
+    return vectors
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # "lazy": port mở ngay (liveness OK), /ready trả 503 cho đến khi warm-up xong
+    warm_up_task = None
+    if STARTUP_MODE == "eager":
+        await run_warm_up()
+    else:
+        warm_up_task = asyncio.create_task(run_warm_up())
+    yield
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    info_stats.stop()
+    data_version.stop()
+    db_executor.shutdown()
+
+def require_ready():
+    """
+    Từ chối request (503) khi model hoặc backend tìm kiếm chưa sẵn sàng.
+    """
+    if not startup_state.ready:
+        detail = startup_state.error or f"Service is starting ({startup_state.current_phase or 'warm-up'})."
+        raise HTTPException(status_code=503, detail=detail)
 
 # 4. Khởi tạo ứng dụng FastAPI
 app = FastAPI(
     title="Products Finder API (with Chunking)",
     description="An API to find products using semantic vector search with text chunking for better accuracy.",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
+app.add_middleware(MetricsMiddleware, requests_total=requests_total, request_duration=request_duration,
+                   server_timing=SERVER_TIMING)
 
 # --- ĐỊNH NGHĨA API ---
 
@@ -48,112 +304,318 @@ class SearchRequest(BaseModel):
     text: str
     limit: int = 5  # Số kết quả trả về, mặc định là 5
     chunk_limit: int = 20  # Số chunks tối đa để tìm kiếm, mặc định là 20
+    # Bộ lọc (tùy chọn), áp dụng ngay trong vector search chứ không lọc sau khi lấy kết quả
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    brands: Optional[List[str]] = None  # Khớp chính xác với tên thương hiệu trong dữ liệu
+    categories: Optional[List[str]] = None  # Khớp chính xác với category_name
+    min_rating: Optional[float] = None
+    # "vector", "lexical" hoặc "hybrid" (mặc định: SEARCH_MODE)
+    mode: Optional[Literal["vector", "lexical", "hybrid"]] = None
+
+    def search_filter(self) -> Optional[dict]:
+        return build_search_filter(min_price=self.min_price, max_price=self.max_price, brands=self.brands,
+                                   categories=self.categories, min_rating=self.min_rating)
+
+class BatchSearchRequest(BaseModel):
+    requests: List[SearchRequest]
+
+def search_mode(request: SearchRequest) -> str:
+    """
+    Chế độ tìm kiếm của request; không có index từ khóa thì chỉ tìm bằng vector.
+    """
+    if lexical_index is None:
+        return "vector"
+    return request.mode or SEARCH_MODE
+
+def aggregate_chunks(chunk_results: list, max_products: int) -> list:
+    with stage_timer.stage("aggregation"):
+        return aggregate_search_results(
+            results=chunk_results,
+            max_products=max_products,
+            scoring=PRODUCT_SCORING,
+            top_n=PRODUCT_SCORING_TOP_N,
+            temperature=PRODUCT_SCORING_TEMPERATURE
+        )
+
+def lexical_products(request: SearchRequest, filters: Optional[dict], max_products: int) -> list:
+    """
+    Tìm theo từ khóa (BM25 trên tên sản phẩm và nội dung chunk) rồi gộp theo sản phẩm.
+    Chạy trực tiếp trên event loop vì chỉ mất dưới 1 ms.
+    """
+    with stage_timer.stage("lexical_search"):
+        chunk_results = lexical_index.search(request.text, request.chunk_limit, filters=filters)
+    return aggregate_chunks(chunk_results, max_products)
+
+def lexical_fast_path(text: str, lexical_results: list) -> bool:
+    """
+    Truy vấn là mã model/SKU và sản phẩm đứng đầu kết quả từ khóa chứa đúng mã đó:
+    trả lời bằng index từ khóa, bỏ qua model embedding.
+    """
+    if not (LEXICAL_FAST_PATH and lexical_results):
+        return False
+    terms = sku_terms(text)
+    return bool(terms) and lexical_index.has_terms(lexical_results[0]["product_id"], terms)
+
+async def vector_products(request: SearchRequest, query_vector: list, filters: Optional[dict],
+                          max_products: int) -> list:
+    """
+    Tìm kiếm vector và gộp chunks thành tối đa `max_products` sản phẩm.
+    Với SEARCH_AGGREGATION=server, kết quả đã kèm thông tin sản phẩm.
+    """
+    if SEARCH_AGGREGATION == 'server':
+        # Tìm kiếm và gộp chunks theo sản phẩm ngay trong database, chỉ nhận về `max_products` sản phẩm
+        with stage_timer.stage("vector_search"):
+            return await db_executor.run(
+                search_backend.search_products,
+                query_vector,
+                limit=max_products,
+                chunk_limit=request.chunk_limit,
+                num_candidates=request.chunk_limit * 5,
+                filters=filters
+            )
+
+    # Tìm kiếm các chunks gần nhất (numCandidates lớn hơn để có lựa chọn tốt)
+    with stage_timer.stage("vector_search"):
+        chunk_results = await db_executor.run(
+            search_backend.search,
+            query_vector,
+            limit=request.chunk_limit,
+            num_candidates=request.chunk_limit * 5,
+            fields=SEARCH_FIELDS,
+            filters=filters
+        )
+    return aggregate_chunks(chunk_results, max_products)
+
+async def find_products(request: SearchRequest, query_vector: Optional[list] = None) -> list:
+    """
+    Tìm sản phẩm cho một request: cache kết quả -> (từ khóa) -> vector hóa -> tìm chunks -> gộp
+    -> (trộn RRF) -> ghép thông tin sản phẩm.
+    `query_vector` cho phép truyền vector đã tính sẵn (ví dụ khi encode cả batch một lần).
+    """
+    filters = request.search_filter()
+    mode = search_mode(request)
+    cache_key = None
+    if response_cache is not None:
+        cache_key = response_cache_key("search", request.text, data_version.value, limit=request.limit,
+                                       chunk_limit=request.chunk_limit, scoring=PRODUCT_SCORING,
+                                       aggregation=SEARCH_AGGREGATION, filters=filters, mode=mode)
+        with stage_timer.stage("response_cache"):
+            cached = await cached_response("search", cache_key)
+        if cached is not None:
+            return cached
+
+    lexical_results = None
+    if mode != "vector":
+        # a. Tìm theo từ khóa: đủ cho mã sản phẩm/model (bỏ qua model embedding), và dùng để trộn hạng
+        lexical_results = lexical_products(request, filters,
+                                           request.limit if mode == "lexical" else request.chunk_limit)
+
+    if mode == "lexical" or lexical_fast_path(request.text, lexical_results):
+        results = lexical_results[:request.limit]
+    else:
+        # b. Vector hóa câu truy vấn từ client
+        if query_vector is None:
+            query_vector = await encode_query(request.text)
+
+        if mode == "hybrid":
+            # c. Trộn hạng kết quả vector và từ khóa (reciprocal rank fusion) trên nhiều ứng viên hơn `limit`
+            vector_results = await vector_products(request, query_vector, filters, request.chunk_limit)
+            with stage_timer.stage("fusion"):
+                results = reciprocal_rank_fusion({"vector": vector_results, "lexical": lexical_results},
+                                                 request.limit, k=RRF_K)
+        else:
+            results = await vector_products(request, query_vector, filters, request.limit)
+            if SEARCH_AGGREGATION == 'server':
+                # Đã có thông tin sản phẩm ($lookup trong pipeline hoặc từ cache sản phẩm)
+                if cache_key is not None:
+                    await cache_response("search", cache_key, results)
+                return results
+
+    # d. Ghép thông tin sản phẩm (một truy vấn $in cho tất cả sản phẩm trả về)
+    with stage_timer.stage("product_join"):
+        results = await db_executor.run(search_backend.catalog.attach, results)
+
+    if cache_key is not None:
+        await cache_response("search", cache_key, results)
+    return results
 
 # 6. Tạo endpoint /search
-@app.post("/search", summary="Find products by semantic search with chunking")
+@app.post("/search", summary="Find products by semantic search with chunking", dependencies=[Depends(require_ready)])
 async def search_products(request: SearchRequest):
     """
     Nhận một chuỗi văn bản, tìm kiếm các sản phẩm có nội dung tương tự sử dụng chunking.
     - **text**: Câu hoặc đoạn văn bản để tìm kiếm.
     - **limit**: Số lượng sản phẩm tối đa muốn nhận.
     - **chunk_limit**: Số lượng chunks tối đa để tìm kiếm (sẽ được gộp lại thành sản phẩm).
+    - **min_price / max_price / brands / categories / min_rating**: Bộ lọc tùy chọn.
     """
     if not request.text:
         raise HTTPException(status_code=400, detail="Search text cannot be empty.")
 
     try:
-        # a. Vector hóa câu truy vấn từ client
-        query_vector = model.encode(request.text).tolist()
-
-        # b. Xây dựng aggregation pipeline cho Vector Search với chunks
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": "vector_search_chunked",  # Tên index cho chunked collection
-                    "path": "description_vector",      # Trường chứa vector trong document
-                    "queryVector": query_vector,       # Vector của câu truy vấn
-                    "numCandidates": request.chunk_limit * 5,  # Nhiều candidates hơn để có lựa chọn tốt
-                    "limit": request.chunk_limit       # Số chunks tối đa để lấy
-                }
-            },
-            {
-                # c. Định dạng lại kết quả đầu ra
-                "$project": {
-                    "_id": 0,
-                    "product_id": 1,
-                    "name": 1,
-                    "url": 1,
-                    "brand": 1,
-                    "category_name": 1,
-                    "price": 1,
-                    "market_price": 1,
-                    "average_rating": 1,
-                    "chunk_text": 1,
-                    "chunk_id": 1,
-                    "is_chunk": 1,
-                    "descriptioninfo": "$chunk_text",  # Use chunk text as description
-                    "score": {
-                        "$meta": "vectorSearchScore"
-                    }
-                }
-            }
-        ]
-        
-        # d. Thực thi query và chuyển kết quả thành list
-        chunk_results = list(collection.aggregate(pipeline))
-        
-        # e. Aggregate chunks back to products
-        aggregated_results = aggregate_search_results(
-            results=chunk_results,
-            max_products=request.limit
-        )
-        
-        return aggregated_results
+        results = await find_products(request)
+        # Tự serialize để đo được thời gian của bước này
+        with stage_timer.stage("serialization"):
+            return JSONResponse(content=jsonable_encoder(results))
 
     except Exception as e:
         # Trả về lỗi server nếu có vấn đề xảy ra
         raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
 
+# 6b. Tìm kiếm nhiều câu truy vấn trong một request
+@app.post("/search/batch", summary="Run many searches in one request", dependencies=[Depends(require_ready)])
+async def search_products_batch(request: BatchSearchRequest):
+    """
+    Nhận danh sách SearchRequest, vector hóa tất cả câu truy vấn trong một lần gọi model,
+    chạy các truy vấn vector đồng thời và trả kết quả theo đúng thứ tự.
+    Mỗi phần tử là `{"results": [...]}` hoặc `{"error": "..."}`: lỗi của một truy vấn
+    không làm hỏng cả batch.
+    """
+    if len(request.requests) > BATCH_SEARCH_MAX_SIZE:
+        raise HTTPException(status_code=400,
+                            detail=f"A batch can contain at most {BATCH_SEARCH_MAX_SIZE} requests.")
+
+    try:
+        responses = await search_many(request.requests)
+        with stage_timer.stage("serialization"):
+            return JSONResponse(content=jsonable_encoder(responses))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
+
+async def search_many(items: List[SearchRequest]) -> List[dict]:
+    """
+    Chạy nhiều truy vấn: encode một lần, tìm kiếm đồng thời, trả `{"results"}`/`{"error"}` theo thứ tự.
+    Chỉ ném lỗi khi không vector hóa được các câu truy vấn.
+    """
+    valid = [index for index, item in enumerate(items) if item.text]
+    vectors = await encode_queries([items[index].text for index in valid])
+
+    outcomes = await asyncio.gather(
+        *(find_products(items[index], query_vector) for index, query_vector in zip(valid, vectors)),
+        return_exceptions=True
+    )
+
+    responses = [{"error": "Search text cannot be empty."} for _ in items]
+    for index, outcome in zip(valid, outcomes):
+        if isinstance(outcome, Exception):
+            responses[index] = {"error": f"An internal server error occurred: {outcome}"}
+        else:
+            responses[index] = {"results": outcome}
+    return responses
+
+async def spool_request_body(request: Request):
+    """
+    Ghi body vào file tạm (chỉ giữ tối đa 1 MB trong bộ nhớ), đọc theo từng chunk khi dữ liệu tới.
+    Body phải được đọc hết trước khi trả StreamingResponse: trong lúc stream, Starlette dùng
+    kênh receive để phát hiện client ngắt kết nối.
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    async for chunk in request.stream():
+        body.write(chunk)
+    body.seek(0)
+    return body
+
+def parse_stream_item(line: bytes):
+    """
+    Một dòng NDJSON là một SearchRequest (có thể kèm "id" để đối chiếu), hoặc một chuỗi JSON.
+    Trả về (id, SearchRequest) hoặc (id, thông báo lỗi); id được lấy trước khi kiểm tra
+    request để dòng lỗi vẫn đối chiếu được.
+    """
+    try:
+        data = json.loads(line)
+    except ValueError as e:
+        return None, f"Invalid request line: {e}"
+    if isinstance(data, str):
+        data = {"text": data}
+    if not isinstance(data, dict):
+        return None, "Each line must be a JSON object or string."
+    item_id = data.get("id")
+    try:
+        return item_id, SearchRequest(**data)
+    except (ValueError, ValidationError) as e:
+        return item_id, f"Invalid request line: {e}"
+
+async def stream_search_results(body) -> AsyncIterator[str]:
+    """
+    Chia các dòng truy vấn thành batch STREAM_BATCH_SIZE; tối đa STREAM_MAX_IN_FLIGHT batch được
+    xử lý cùng lúc (batch sau được encode trong khi batch trước đang tìm kiếm), kết quả được
+    trả về từng dòng theo đúng thứ tự nên bộ nhớ không tăng theo kích thước file truy vấn.
+    """
+    async def process(batch) -> str:
+        requests = [item for _, _, item in batch if isinstance(item, SearchRequest)]
+        try:
+            responses = iter(await search_many(requests))
+        except Exception as e:
+            responses = iter([{"error": f"An internal server error occurred: {e}"}] * len(requests))
+
+        lines = []
+        for index, item_id, item in batch:
+            response = next(responses) if isinstance(item, SearchRequest) else {"error": item}
+            lines.append(json.dumps({"index": index, "id": item_id, **response},
+                                    ensure_ascii=False, default=str) + "\n")
+        return "".join(lines)
+
+    pending: deque = deque()
+    batch, index = [], 0
+    try:
+        for line in body:
+            if not line.strip():
+                continue
+            batch.append((index, *parse_stream_item(line)))
+            index += 1
+            if len(batch) >= STREAM_BATCH_SIZE:
+                pending.append(asyncio.create_task(process(batch)))
+                batch = []
+                if len(pending) >= STREAM_MAX_IN_FLIGHT:
+                    yield await pending.popleft()
+        if batch:
+            pending.append(asyncio.create_task(process(batch)))
+        while pending:
+            yield await pending.popleft()
+    finally:
+        # Client ngắt kết nối: hủy các batch còn dở
+        for task in pending:
+            task.cancel()
+        body.close()
+
+# 6c. Tìm kiếm hàng loạt dạng stream NDJSON (cho các job đối chiếu offline)
+@app.post("/search/stream", summary="Stream searches as NDJSON", dependencies=[Depends(require_ready)])
+async def search_products_stream(request: Request):
+    """
+    Body: mỗi dòng là một SearchRequest dạng JSON (có thể kèm "id"). Kết quả được stream về
+    dạng NDJSON, mỗi dòng `{"index", "id", "results"}` hoặc `{"index", "id", "error"}`,
+    theo đúng thứ tự các dòng truy vấn.
+    """
+    body = await spool_request_body(request)
+    return StreamingResponse(stream_search_results(body), media_type="application/x-ndjson")
+
 # 7. Endpoint để kiểm tra thông tin về chunking
-@app.get("/info", summary="Get information about the chunked data")
+@app.get("/info", summary="Get information about the chunked data", dependencies=[Depends(require_ready)])
 async def get_info():
     """
-    Lấy thông tin về dữ liệu đã được chunk.
+    Lấy thông tin về dữ liệu đã được chunk (từ bản thống kê tính sẵn trong bộ nhớ).
     """
     try:
-        total_chunks = collection.count_documents({})
-        unique_products = len(collection.distinct("product_id"))
-        
-        # Get some sample statistics
-        pipeline = [
-            {"$group": {
-                "_id": "$product_id",
-                "chunk_count": {"$sum": 1}
-            }},
-            {"$group": {
-                "_id": None,
-                "avg_chunks_per_product": {"$avg": "$chunk_count"},
-                "max_chunks_per_product": {"$max": "$chunk_count"},
-                "min_chunks_per_product": {"$min": "$chunk_count"}
-            }}
-        ]
-        
-        stats = list(collection.aggregate(pipeline))
-        chunk_stats = stats[0] if stats else {}
+        chunk_stats = await info_stats.get() or {}
         
         return {
-            "total_chunks": total_chunks,
-            "unique_products": unique_products,
+            "total_chunks": chunk_stats.get("total_chunks", 0),
+            "unique_products": chunk_stats.get("unique_products", 0),
             "average_chunks_per_product": round(chunk_stats.get("avg_chunks_per_product", 0), 2),
             "max_chunks_per_product": chunk_stats.get("max_chunks_per_product", 0),
             "min_chunks_per_product": chunk_stats.get("min_chunks_per_product", 0),
-            "chunking_enabled": True
+            "chunking_enabled": True,
+            "search_backend": search_backend.name,
+            "lexical_search": lexical_index is not None,
+            "search_mode": SEARCH_MODE if lexical_index is not None else "vector",
+            "stats_updated_at": chunk_stats.get("updated_at")
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting info: {e}")
 
 # 8. Endpoint để tìm kiếm chunks cụ thể (for debugging)
-@app.post("/search-chunks", summary="Search chunks directly (for debugging)")
+@app.post("/search-chunks", summary="Search chunks directly (for debugging)", dependencies=[Depends(require_ready)])
 async def search_chunks(request: SearchRequest):
     """
     Tìm kiếm trực tiếp các chunks (dành cho debug).
@@ -162,36 +624,82 @@ async def search_chunks(request: SearchRequest):
         raise HTTPException(status_code=400, detail="Search text cannot be empty.")
 
     try:
-        query_vector = model.encode(request.text).tolist()
-
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": "vector_search_chunked",
-                    "path": "description_vector",
-                    "queryVector": query_vector,
-                    "numCandidates": 100,
-                    "limit": request.limit * 3  # More chunks for debugging
-                }
-            },
-            {
-                "$project": {
-                    "_id": 0,
-                    "product_id": 1,
-                    "name": 1,
-                    "chunk_text": 1,
-                    "chunk_id": 1,
-                    "score": {"$meta": "vectorSearchScore"}
-                }
-            }
-        ]
-        
-        results = list(collection.aggregate(pipeline))
+        filters = request.search_filter()
+        cache_key = None
+        if response_cache is not None:
+            cache_key = response_cache_key("search-chunks", request.text, data_version.value, limit=request.limit,
+                                           filters=filters)
+            cached = await cached_response("search-chunks", cache_key)
+            if cached is not None:
+                return cached
+
+        query_vector = await encode_query(request.text)
+
+        with stage_timer.stage("vector_search"):
+            results = await db_executor.run(
+                search_backend.search,
+                query_vector,
+                limit=request.limit * 3,  # More chunks for debugging
+                num_candidates=100,
+                fields=["product_id", "chunk_text", "chunk_id"],
+                filters=filters
+            )
+        with stage_timer.stage("product_join"):
+            results = await db_executor.run(search_backend.catalog.attach, results)
+        if cache_key is not None:
+            await cache_response("search-chunks", cache_key, results)
         return results
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching chunks: {e}")
 
+# 9. Endpoint để xem thống kê cache
+@app.get("/cache-stats", summary="Get embedding cache statistics")
+async def get_cache_stats():
+    """
+    Lấy số lần hit/miss và kích thước hiện tại của cache vector truy vấn, cache
+    thông tin sản phẩm và cache kết quả (theo từng endpoint), cùng thống kê gom
+    batch của bộ lập lịch embedding.
+    """
+    catalog = search_backend.catalog if search_backend is not None else None
+    response_stats = None
+    if response_cache is not None:
+        # Kích thước cache SQLite là một truy vấn COUNT trên đĩa
+        response_stats = (await asyncio.to_thread(response_cache.stats) if response_cache.blocking
+                          else response_cache.stats())
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "embedding_batcher": embedding_batcher.stats(),
+        "product_cache": catalog.stats() if isinstance(catalog, CachedProductCatalog) else None,
+        "response_cache": response_stats,
+        "data_version": data_version.value
+    }
+
+# 10. Metrics cho Prometheus
+@app.get("/metrics", summary="Prometheus metrics")
+async def metrics():
+    """
+    Số request và histogram độ trễ theo endpoint, độ trễ từng giai đoạn tìm kiếm
+    (encode, vector_search, aggregation, product_join, serialization), dạng text của Prometheus.
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type=metrics_registry.content_type)
+
+# 11. Liveness và readiness cho health check
+@app.get("/health", summary="Liveness probe")
+async def health():
+    """
+    Tiến trình đang chạy và event loop phản hồi (không phụ thuộc model).
+    """
+    return {"status": "alive"}
+
+@app.get("/ready", summary="Readiness probe")
+async def ready():
+    """
+    Trả 200 khi model và backend tìm kiếm đã sẵn sàng, 503 trong lúc warm-up hoặc khi lỗi.
+    Kèm thời gian của từng giai đoạn khởi động.
+    """
+    return JSONResponse(status_code=200 if startup_state.ready else 503, content=startup_state.status())
+
 # Lệnh để chạy server (sử dụng cho việc phát triển)
 if __name__ == "__main__":
     print("Starting FastAPI server with chunking support...")
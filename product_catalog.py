@@ -0,0 +1,180 @@
+import os
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+from cache import LRUCache
+
+
+# Product fields stored once per product and joined into search results
+PRODUCT_FIELDS = ["name", "url", "brand", "category_name", "price", "market_price", "average_rating"]
+
+# Product fields also copied into every chunk document, so that the vector
+# search can pre-filter on them (Atlas filter fields, LocalSearchBackend masks)
+FILTER_FIELDS = ["price", "brand", "category_name", "average_rating"]
+
+
+def build_product_metadata(product: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Create the products collection document of a raw product (without its chunks)
+    """
+    description = product.get('descriptioninfo') or ''
+    metadata = {'_id': product.get('data_product')}
+    metadata.update({field: product.get(field) for field in PRODUCT_FIELDS})
+    # Original full description for reference
+    metadata['full_description'] = description[:200] + "..." if len(description) > 200 else description
+    return metadata
+
+
+def filter_values(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Filter fields of a product metadata document, as stored in its chunk documents
+    """
+    return {field: metadata.get(field) for field in FILTER_FIELDS}
+
+
+def products_path_for(index_path: str) -> str:
+    """
+    Path of the product metadata file exported next to a local index
+
+    Inside an embedding store directory, or ``<index>.products.jsonl`` beside a JSON Lines index.
+    """
+    if os.path.isdir(index_path):
+        return os.path.join(index_path, "products.jsonl")
+    root, _ = os.path.splitext(index_path)
+    return root + ".products.jsonl"
+
+
+def save_products(products: Iterable[Dict[str, Any]], path: str) -> int:
+    """
+    Write product metadata documents to a JSON Lines file
+
+    Returns:
+        Number of products written
+    """
+    count = 0
+    # Written beside and renamed into place: readers never see a partial file
+    temp_path = f"{path}.tmp-{os.getpid()}"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for product in products:
+            f.write(json.dumps(product, ensure_ascii=False, default=str) + "\n")
+            count += 1
+    os.replace(temp_path, path)
+    return count
+
+
+class ProductCatalog:
+    """
+    Product metadata looked up by product_id
+    """
+
+    # True when a lookup queries the database (AtlasSearchBackend then joins with $lookup in the pipeline)
+    reads_database = False
+
+    def get_many(self, product_ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        """
+        Return {product_id: metadata} for the ids that are known
+        """
+        raise NotImplementedError
+
+    def attach(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Fill the product fields of search result rows in place (one lookup for all rows)
+
+        Rows of unknown products are left untouched, so chunk documents that still
+        carry their product fields keep working.
+        """
+        product_ids = list(dict.fromkeys(row.get('product_id') for row in rows))
+        products = self.get_many(product_ids) if product_ids else {}
+        for row in rows:
+            product = products.get(row.get('product_id'))
+            if product is not None:
+                row.update({field: product.get(field) for field in PRODUCT_FIELDS})
+        return rows
+
+
+class InMemoryProductCatalog(ProductCatalog):
+    """
+    Catalog held in a dictionary, e.g. loaded from the file exported with a local index
+    """
+
+    def __init__(self, products: Optional[Dict[Any, Dict[str, Any]]] = None):
+        self.products = products or {}
+
+    @classmethod
+    def from_jsonl(cls, path: str) -> "InMemoryProductCatalog":
+        products = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    product = json.loads(line)
+                    products[product.get('_id')] = product
+        return cls(products)
+
+    def get_many(self, product_ids):
+        return {product_id: self.products[product_id] for product_id in product_ids if product_id in self.products}
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+
+class MongoProductCatalog(ProductCatalog):
+    """
+    Catalog read from the products collection with one batched ``$in`` query per lookup
+    """
+
+    reads_database = True
+
+    def __init__(self, collection, max_time_ms: Optional[int] = None):
+        self.collection = collection
+        self.max_time_ms = max_time_ms
+
+    def get_many(self, product_ids):
+        cursor = self.collection.find({"_id": {"$in": list(product_ids)}},
+                                      {field: 1 for field in PRODUCT_FIELDS})
+        if self.max_time_ms:
+            cursor = cursor.max_time_ms(self.max_time_ms)
+        return {product["_id"]: product for product in cursor}
+
+
+class CachedProductCatalog(ProductCatalog):
+    """
+    Bounded LRU/TTL cache in front of another catalog
+
+    Only the ids missing from the cache are fetched, in one batch. ``clear`` is
+    called when load_data.py publishes a new data version.
+    """
+
+    def __init__(self, catalog: ProductCatalog, max_size: int = 10000, ttl: Optional[float] = 3600):
+        """
+        Initialize the cache
+
+        Args:
+            catalog: Catalog queried on cache misses
+            max_size: Maximum number of cached products
+            ttl: Seconds a product stays cached, or None/0 to keep it until invalidated
+        """
+        self.catalog = catalog
+        self.cache = LRUCache(max_size=max_size, ttl=ttl)
+
+    def get_many(self, product_ids):
+        products, missing = {}, []
+        for product_id in product_ids:
+            product = self.cache.get(product_id)
+            if product is None:
+                missing.append(product_id)
+            else:
+                products[product_id] = product
+
+        if missing:
+            fetched = self.catalog.get_many(missing)
+            for product_id, product in fetched.items():
+                self.cache.set(product_id, product)
+            products.update(fetched)
+        return products
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
@@ -0,0 +1,683 @@
+import os
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from cache import LRUCache
+from embedding_store import EmbeddingStore, StoreDocuments, is_embedding_store
+from database import compute_chunk_stats as compute_collection_chunk_stats
+from text_chunker import aggregate_search_results
+from product_catalog import (FILTER_FIELDS, PRODUCT_FIELDS, InMemoryProductCatalog, MongoProductCatalog,
+                             ProductCatalog, products_path_for)
+
+
+# Field holding the chunk embedding in every chunk document
+VECTOR_FIELD = 'description_vector'
+
+# Chunk fields returned by /search and /search-chunks for aggregate_search_results
+SEARCH_FIELDS = ["product_id", "chunk_text", "chunk_id", "is_chunk"]
+
+
+def build_search_filter(min_price: Optional[float] = None,
+                        max_price: Optional[float] = None,
+                        brands: Optional[List[str]] = None,
+                        categories: Optional[List[str]] = None,
+                        min_rating: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Build the chunk pre-filter of a search, or None when no condition is set
+
+    The filter uses the MQL subset accepted by the ``$vectorSearch`` ``filter``
+    clause ($and, $in, $gte, $lte, ...), which LocalSearchBackend evaluates too.
+    Brand and category values must match the catalog exactly.
+    """
+    clauses = []
+    price = {}
+    if min_price is not None:
+        price["$gte"] = min_price
+    if max_price is not None:
+        price["$lte"] = max_price
+    if price:
+        clauses.append({"price": price})
+    if brands:
+        clauses.append({"brand": {"$in": list(brands)}})
+    if categories:
+        clauses.append({"category_name": {"$in": list(categories)}})
+    if min_rating is not None:
+        clauses.append({"average_rating": {"$gte": min_rating}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def vector_index_definition(dimensions: int = 768) -> Dict[str, Any]:
+    """
+    Atlas Vector Search index of the chunk collection, with the filter fields
+    """
+    fields = [{"numDimensions": dimensions, "path": VECTOR_FIELD, "similarity": "cosine", "type": "vector"}]
+    fields += [{"path": field, "type": "filter"} for field in FILTER_FIELDS]
+    return {"fields": fields}
+
+
+def save_chunk_documents(documents: Iterable[Dict[str, Any]], path: str) -> int:
+    """
+    Write chunk documents (with their vectors) to a JSON Lines file
+
+    Args:
+        documents: Chunk documents as produced by process_products_with_chunking
+        path: Output file path
+
+    Returns:
+        Number of documents written
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    count = 0
+    # Written beside and renamed into place: an API starting meanwhile reads the previous file
+    temp_path = f"{path}.tmp-{os.getpid()}"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for doc in documents:
+            doc = {key: value for key, value in doc.items() if key != '_id'}
+            f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(temp_path, path)
+    return count
+
+
+def load_chunk_documents(path: str) -> List[Dict[str, Any]]:
+    """
+    Read chunk documents from a JSON Lines file written by save_chunk_documents
+    """
+    documents = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                documents.append(json.loads(line))
+    return documents
+
+
+def document_column(documents: Iterable[Dict[str, Any]], field: str) -> List[Any]:
+    """
+    Values of field over chunk documents (ids straight from the id tables of an embedding store)
+    """
+    if isinstance(documents, StoreDocuments):
+        return documents.column(field)
+    return [doc.get(field) for doc in documents]
+
+
+def compute_chunk_stats(product_ids: Iterable[Any]) -> Dict[str, Any]:
+    """
+    Compute chunk count statistics from the product_id of every chunk
+    """
+    counts: Dict[Any, int] = {}
+    for product_id in product_ids:
+        counts[product_id] = counts.get(product_id, 0) + 1
+
+    if not counts:
+        return {"total_chunks": 0, "unique_products": 0,
+                "avg_chunks_per_product": 0, "max_chunks_per_product": 0, "min_chunks_per_product": 0}
+
+    values = counts.values()
+    return {
+        "total_chunks": sum(values),
+        "unique_products": len(counts),
+        "avg_chunks_per_product": sum(values) / len(counts),
+        "max_chunks_per_product": max(values),
+        "min_chunks_per_product": min(values)
+    }
+
+
+class SearchBackend:
+    """
+    Interface of a chunk-level vector search backend
+
+    Results mirror the documents returned by the Atlas ``$vectorSearch`` stage:
+    the requested fields plus a ``score`` in [0, 1] (cosine similarity mapped
+    to ``(1 + cos) / 2``), ordered by decreasing score.
+
+    Chunk results only carry the product_id; ``catalog`` supplies the product
+    fields (see ProductCatalog.attach).
+    """
+
+    name = "base"
+    catalog: ProductCatalog = InMemoryProductCatalog()
+
+    def search(self,
+               query_vector: List[float],
+               limit: int,
+               num_candidates: int,
+               fields: List[str],
+               filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Return the limit nearest chunks, only among chunks matching filters
+        (see build_search_filter) when given
+        """
+        raise NotImplementedError
+
+    def search_products(self,
+                        query_vector: List[float],
+                        limit: int,
+                        chunk_limit: int,
+                        num_candidates: int,
+                        max_relevant_chunks: int = 3,
+                        filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Search chunk_limit chunks and group them into at most limit products
+
+        Products are scored by their best chunk; the rows have the same shape as
+        text_chunker.aggregate_search_results, with the product fields joined.
+        """
+        chunks = self.search(query_vector, chunk_limit, num_candidates, fields=["product_id", "chunk_text"],
+                             filters=filters)
+        products = aggregate_search_results(chunks, max_products=limit, max_relevant_chunks=max_relevant_chunks)
+        return self.catalog.attach(products)
+
+    def chunk_stats(self) -> Dict[str, Any]:
+        """
+        Return total_chunks, unique_products and avg/max/min chunks per product
+        """
+        raise NotImplementedError
+
+
+class AtlasSearchBackend(SearchBackend):
+    """
+    Vector search through the MongoDB Atlas ``$vectorSearch`` aggregation stage
+    """
+
+    name = "atlas"
+
+    def __init__(self, collection, index_name: str = "vector_search_chunked",
+                 max_time_ms: Optional[int] = None, products_collection=None):
+        self.collection = collection
+        self.index_name = index_name
+        self.max_time_ms = max_time_ms
+        self.products_collection = products_collection
+        if products_collection is not None:
+            self.catalog = MongoProductCatalog(products_collection, max_time_ms=max_time_ms)
+
+    def _aggregate(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        kwargs = {'maxTimeMS': self.max_time_ms} if self.max_time_ms else {}
+        return list(self.collection.aggregate(pipeline, **kwargs))
+
+    def _vector_search(self, query_vector, limit, num_candidates, filters) -> Dict[str, Any]:
+        stage = {
+            "index": self.index_name,      # Tên index cho chunked collection
+            "path": VECTOR_FIELD,          # Trường chứa vector trong document
+            "queryVector": query_vector,   # Vector của câu truy vấn
+            "numCandidates": num_candidates,
+            "limit": limit                 # Số chunks tối đa để lấy
+        }
+        if filters:
+            # Pre-filter on the index filter fields (see vector_index_definition)
+            stage["filter"] = filters
+        return {"$vectorSearch": stage}
+
+    def search(self, query_vector, limit, num_candidates, fields, filters=None):
+        projection = {"_id": 0}
+        projection.update({field: 1 for field in fields})
+        projection["score"] = {"$meta": "vectorSearchScore"}
+
+        pipeline = [
+            self._vector_search(query_vector, limit, num_candidates, filters),
+            {"$project": projection}
+        ]
+        return self._aggregate(pipeline)
+
+    def search_products(self, query_vector, limit, chunk_limit, num_candidates, max_relevant_chunks=3,
+                        filters=None):
+        """
+        Group chunks by product_id in the aggregation pipeline
+
+        Only ``limit`` product rows leave the database instead of ``chunk_limit``
+        chunk documents. When the catalog queries the products collection, the
+        product fields are joined with ``$lookup`` after the ``$limit``; otherwise
+        (e.g. CachedProductCatalog) ``catalog`` fills them from memory.
+        """
+        lookup = self.products_collection is not None and self.catalog.reads_database
+
+        group = {
+            "_id": "$product_id",
+            "score": {"$max": "$score"},
+            "descriptioninfo": {"$first": {"$ifNull": ["$chunk_text", ""]}},
+            "relevant_chunks": {"$push": {"$ifNull": ["$chunk_text", ""]}},
+            "total_chunks_found": {"$sum": 1}
+        }
+
+        projection = {"_id": 0, "product_id": "$_id"}
+        if lookup:
+            projection.update({field: {"$arrayElemAt": [f"$product.{field}", 0]} for field in PRODUCT_FIELDS})
+        projection.update({
+            "score": 1,
+            "descriptioninfo": 1,
+            "relevant_chunks": {"$slice": ["$relevant_chunks", max_relevant_chunks]},
+            "total_chunks_found": 1
+        })
+
+        pipeline = [
+            self._vector_search(query_vector, chunk_limit, num_candidates, filters),
+            {"$project": {"product_id": 1, "chunk_text": 1, "score": {"$meta": "vectorSearchScore"}}},
+            # $first/$push in $group follow this order: best chunk first
+            {"$sort": {"score": -1}},
+            {"$group": group},
+            {"$sort": {"score": -1, "_id": 1}},
+            {"$limit": limit}
+        ]
+        if lookup:
+            pipeline.append({"$lookup": {
+                "from": self.products_collection.name,
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "product"
+            }})
+        pipeline.append({"$project": projection})
+        products = self._aggregate(pipeline)
+        return products if lookup else self.catalog.attach(products)
+
+    def chunk_stats(self):
+        return compute_collection_chunk_stats(self.collection, max_time_ms=self.max_time_ms)
+
+
+class ChunkFilter:
+    """
+    Evaluates search filters over the chunk documents of a local index
+
+    Each filtered field is turned once into a column array (float64 values, or
+    int32 codes for strings) and a filter into a boolean row mask; masks of
+    repeated filters are cached.
+    """
+
+    # Filter masks kept for repeated filters
+    MASK_CACHE_SIZE = 256
+
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self.documents = documents
+        # field -> (numeric values with NaN for missing, or category codes with -1, category -> code)
+        self._columns: Dict[str, tuple] = {}
+        self._masks = LRUCache(max_size=self.MASK_CACHE_SIZE)
+
+    def _column(self, field: str) -> tuple:
+        """
+        Column array of a chunk field: float64 values if every present value is
+        a number, otherwise int32 category codes
+        """
+        column = self._columns.get(field)
+        if column is None:
+            values = document_column(self.documents, field)
+            present = [value for value in values if value is not None]
+            if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+                column = (np.asarray([np.nan if value is None else value for value in values], dtype=np.float64),
+                          None)
+            else:
+                codes: Dict[Any, int] = {}
+                column = (np.asarray([-1 if value is None else codes.setdefault(value, len(codes))
+                                      for value in values], dtype=np.int32), codes)
+            self._columns[field] = column
+        return column
+
+    def _match_field(self, field: str, condition: Any) -> np.ndarray:
+        values, codes = self._column(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        mask = np.ones(len(values), dtype=bool)
+        for operator, operand in condition.items():
+            if operator in ("$in", "$nin", "$eq", "$ne"):
+                operands = operand if operator in ("$in", "$nin") else [operand]
+                if codes is not None:
+                    operands = [codes[value] for value in operands if value in codes]
+                else:
+                    operands = [value for value in operands if isinstance(value, (int, float))]
+                matched = np.isin(values, operands)
+                mask &= matched if operator in ("$in", "$eq") else ~matched
+            elif operator in ("$gt", "$gte", "$lt", "$lte"):
+                if codes is not None:
+                    raise ValueError(f"Filter operator {operator} needs a numeric field: {field}")
+                compare = {"$gt": np.greater, "$gte": np.greater_equal,
+                           "$lt": np.less, "$lte": np.less_equal}[operator]
+                mask &= compare(values, operand)
+            else:
+                raise ValueError(f"Unsupported filter operator: {operator}")
+        return mask
+
+    def _match(self, filters: Dict[str, Any]) -> np.ndarray:
+        mask = np.ones(len(self.documents), dtype=bool)
+        for field, condition in filters.items():
+            if field == "$and":
+                for clause in condition:
+                    mask &= self._match(clause)
+            elif field == "$or":
+                mask &= np.logical_or.reduce([self._match(clause) for clause in condition])
+            else:
+                mask &= self._match_field(field, condition)
+        return mask
+
+    def mask(self, filters: Dict[str, Any]) -> np.ndarray:
+        """
+        Boolean mask of the rows matching filters (MQL subset, see build_search_filter)
+        """
+        key = json.dumps(filters, sort_keys=True, default=str)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self._match(filters)
+            self._masks.set(key, mask)
+        return mask
+
+
+class LocalSearchBackend(SearchBackend):
+    """
+    In-process vector index over the chunk documents
+
+    Modes:
+        exact: brute-force cosine similarity over a NumPy matrix
+        ivf:   inverted file index (k-means lists, probed until num_candidates chunks are scored)
+        hnsw:  HNSW graph from the optional ``hnswlib`` package
+
+    The matrix is either built in memory from the documents (float32) or taken
+    from a memory-mapped EmbeddingStore (float16 / int8). With a quantized
+    matrix the candidates are re-scored with the full-precision vectors, when
+    the store has them, before the final top-k is returned.
+
+    Filters are evaluated into a boolean row mask (see ChunkFilter) and only
+    the matching rows are scored, so a selective filter makes a search cheaper
+    rather than costlier.
+    """
+
+    name = "local"
+
+    # Rows converted to float32 at a time when scoring a reduced-precision matrix
+    BLOCK_ROWS = 65536
+
+    def __init__(self,
+                 documents: List[Dict[str, Any]],
+                 mode: str = "exact",
+                 ivf_lists: Optional[int] = None,
+                 store: Optional[EmbeddingStore] = None,
+                 rescore_factor: int = 4):
+        """
+        Build the index
+
+        Args:
+            documents: Chunk documents (containing a description_vector unless store is
+                       given, in which case they are the store's StoreDocuments)
+            mode: "exact", "ivf" or "hnsw"
+            ivf_lists: Number of IVF lists (defaults to sqrt of the number of chunks)
+            store: Embedding store holding the vectors of documents, row for row
+            rescore_factor: With a quantized store, number of coarse candidates per
+                            requested result that are re-scored in full precision
+        """
+        if mode not in ("exact", "ivf", "hnsw"):
+            raise ValueError(f"Unknown local index mode: {mode}")
+
+        self.mode = mode
+        self.rescore_factor = max(1, rescore_factor)
+        self.scales = None
+        self.full_vectors = None
+
+        if store is not None:
+            if len(store) != len(documents):
+                raise ValueError(f"Embedding store has {len(store)} rows but {len(documents)} documents")
+            self.documents = documents
+            self.vectors = store.vectors
+            self.scales = store.scales
+            self.full_vectors = store.full_vectors
+        else:
+            documents = [doc for doc in documents if doc.get(VECTOR_FIELD) is not None]
+            self.documents = [{key: value for key, value in doc.items() if key not in (VECTOR_FIELD, '_id')}
+                              for doc in documents]
+            if documents:
+                vectors = np.asarray([doc[VECTOR_FIELD] for doc in documents], dtype=np.float32)
+            else:
+                vectors = np.zeros((0, 0), dtype=np.float32)
+            self.vectors = self._normalize(vectors)
+
+        self._filter = ChunkFilter(self.documents)
+
+        self._hnsw = None
+        self._centroids = None
+        self._lists: List[np.ndarray] = []
+        if len(self.documents) and mode == "hnsw":
+            self._build_hnsw()
+        elif len(self.documents) and mode == "ivf":
+            self._build_ivf(ivf_lists or max(1, int(np.sqrt(len(self.documents)))))
+
+    @classmethod
+    def from_jsonl(cls, path: str, **kwargs) -> "LocalSearchBackend":
+        return cls(load_chunk_documents(path), **kwargs)
+
+    @classmethod
+    def from_collection(cls, collection, **kwargs) -> "LocalSearchBackend":
+        return cls(list(collection.find({}, {"_id": 0})), **kwargs)
+
+    @classmethod
+    def from_store(cls, path: str, **kwargs) -> "LocalSearchBackend":
+        store = EmbeddingStore(path)
+        return cls(store.documents(), store=store, **kwargs)
+
+    @property
+    def quantized(self) -> bool:
+        return self.vectors.dtype != np.float32
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        if vectors.size == 0:
+            return vectors
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _dense(self) -> np.ndarray:
+        """
+        Full float32 matrix, only used while building approximate indexes
+        """
+        if self.full_vectors is not None:
+            return np.asarray(self.full_vectors, dtype=np.float32)
+        matrix = np.asarray(self.vectors, dtype=np.float32)
+        return matrix * self.scales[:, None] if self.scales is not None else matrix
+
+    def _similarities(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Similarity of query with the given rows (all rows if None) of the stored matrix
+        """
+        if not self.quantized:
+            matrix = self.vectors if rows is None else self.vectors[rows]
+            return matrix @ query
+
+        count = len(self.vectors) if rows is None else len(rows)
+        similarities = np.empty(count, dtype=np.float32)
+        for start in range(0, count, self.BLOCK_ROWS):
+            end = min(start + self.BLOCK_ROWS, count)
+            block = self.vectors[start:end] if rows is None else self.vectors[rows[start:end]]
+            similarities[start:end] = np.asarray(block, dtype=np.float32) @ query
+        if self.scales is not None:
+            similarities *= self.scales if rows is None else self.scales[rows]
+        return similarities
+
+    def _build_hnsw(self) -> None:
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError("LOCAL_INDEX_MODE=hnsw requires the 'hnswlib' package (pip install hnswlib)")
+
+        vectors = self._dense()
+        count, dim = vectors.shape
+        index = hnswlib.Index(space='ip', dim=dim)
+        index.init_index(max_elements=count, ef_construction=200, M=16)
+        index.add_items(vectors, np.arange(count))
+        self._hnsw = index
+
+    def _build_ivf(self, n_lists: int, iterations: int = 10, seed: int = 0) -> None:
+        vectors = self._dense()
+        rng = np.random.default_rng(seed)
+        n_lists = min(n_lists, len(vectors))
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for i in range(n_lists):
+                members = vectors[assignment == i]
+                if len(members):
+                    centroids[i] = members.mean(axis=0)
+            centroids = self._normalize(centroids)
+
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        self._centroids = centroids
+        self._lists = [np.flatnonzero(assignment == i) for i in range(n_lists)]
+
+    def filter_mask(self, filters: Dict[str, Any]) -> np.ndarray:
+        """
+        Boolean mask of the rows matching filters (MQL subset, see build_search_filter)
+        """
+        return self._filter.mask(filters)
+
+    def _candidate_rows(self, query: np.ndarray, num_candidates: int,
+                        mask: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """
+        Return row ids to score, or None to score every row
+
+        Approximate modes probe the nearest IVF lists until num_candidates rows
+        (matching the mask) are collected; exact mode scores the masked rows.
+        """
+        if self._centroids is None:
+            return None if mask is None else np.flatnonzero(mask)
+
+        order = np.argsort(-(self._centroids @ query))
+        rows, total = [], 0
+        for list_id in order:
+            members = self._lists[list_id]
+            if mask is not None:
+                members = members[mask[members]]
+            rows.append(members)
+            total += len(members)
+            if total >= num_candidates:
+                break
+        return np.concatenate(rows)
+
+    @staticmethod
+    def _best(similarities: np.ndarray, k: int) -> np.ndarray:
+        """
+        Positions of the k largest similarities, highest first
+        """
+        k = min(k, len(similarities))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-similarities, k - 1)[:k] if k < len(similarities) else np.arange(len(similarities))
+        return top[np.argsort(-similarities[top])]
+
+    def _rescore(self, query: np.ndarray, rows: np.ndarray, limit: int):
+        """
+        Re-rank coarse candidates with the full-precision vectors
+        """
+        rows = np.sort(rows)  # Sequential access on the memory-mapped file
+        similarities = np.asarray(self.full_vectors[rows], dtype=np.float32) @ query
+        top = self._best(similarities, limit)
+        return rows[top], similarities[top]
+
+    def _top_k(self, query: np.ndarray, limit: int, num_candidates: int, mask: Optional[np.ndarray] = None):
+        rescore = self.quantized and self.full_vectors is not None
+        k = limit * self.rescore_factor if rescore else limit
+        allowed = len(self.documents) if mask is None else int(mask.sum())
+
+        if self._hnsw is not None and (mask is None or allowed > self.BLOCK_ROWS):
+            k = min(k, allowed)
+            self._hnsw.set_ef(max(num_candidates, k))
+            if mask is None:
+                labels, distances = self._hnsw.knn_query(query, k=k)
+            else:
+                # Large filtered subset: filtered graph search (hnswlib >= 0.7)
+                labels, distances = self._hnsw.knn_query(query, k=k, filter=lambda label: bool(mask[label]))
+            rows, similarities = labels[0].astype(np.int64), 1.0 - distances[0]
+        else:
+            if self._hnsw is not None:
+                # Small filtered subset: scored exactly rather than through the graph
+                candidates = np.flatnonzero(mask)
+            else:
+                candidates = self._candidate_rows(query, num_candidates, mask)
+            similarities = self._similarities(query, candidates)
+            top = self._best(similarities, k)
+            rows = top if candidates is None else candidates[top]
+            similarities = similarities[top]
+
+        if rescore:
+            return self._rescore(query, rows, limit)
+        return rows[:limit], similarities[:limit]
+
+    def search(self, query_vector, limit, num_candidates, fields, filters=None):
+        if not self.documents or limit <= 0:
+            return []
+
+        mask = self.filter_mask(filters) if filters else None
+        if mask is not None and not mask.any():
+            return []
+
+        query = self._normalize(np.asarray(query_vector, dtype=np.float32))
+        rows, similarities = self._top_k(query, limit, num_candidates, mask)
+
+        results = []
+        for row, similarity in zip(rows, similarities):
+            doc = self.documents[int(row)]
+            result = {field: doc[field] for field in fields if field in doc}
+            # Same scale as Atlas vectorSearchScore for cosine similarity
+            result["score"] = float((1.0 + similarity) / 2.0)
+            results.append(result)
+        return results
+
+    def chunk_stats(self):
+        return compute_chunk_stats(document_column(self.documents, 'product_id'))
+
+
+def create_search_backend(name: str,
+                          collection=None,
+                          index_name: str = "vector_search_chunked",
+                          max_time_ms: Optional[int] = None,
+                          local_index_path: Optional[str] = None,
+                          local_index_mode: str = "exact",
+                          rescore_factor: int = 4,
+                          products_collection=None) -> SearchBackend:
+    """
+    Create the search backend selected by configuration
+
+    Args:
+        name: "atlas" or "local"
+        collection: Chunk collection (Atlas backend, or source of the local index
+                    when no local_index_path exists)
+        index_name: Atlas vector search index name
+        max_time_ms: Server-side time limit for Atlas queries
+        local_index_path: Embedding store directory or JSON Lines file of chunk
+                          documents for the local backend
+        local_index_mode: "exact", "ivf" or "hnsw"
+        rescore_factor: Full-precision re-scoring depth for quantized stores
+        products_collection: Product metadata collection joined into the results
+                             (the local backend prefers the products file exported
+                             next to local_index_path)
+    """
+    if name == "atlas":
+        return AtlasSearchBackend(collection, index_name=index_name, max_time_ms=max_time_ms,
+                                  products_collection=products_collection)
+
+    if name == "local":
+        if local_index_path and is_embedding_store(local_index_path):
+            print(f"Memory-mapping embedding store {local_index_path}...")
+            backend = LocalSearchBackend.from_store(local_index_path, mode=local_index_mode,
+                                                    rescore_factor=rescore_factor)
+        elif local_index_path and os.path.exists(local_index_path):
+            print(f"Loading local vector index from {local_index_path}...")
+            backend = LocalSearchBackend.from_jsonl(local_index_path, mode=local_index_mode)
+        elif collection is not None:
+            print("Loading local vector index from MongoDB...")
+            backend = LocalSearchBackend.from_collection(collection, mode=local_index_mode)
+        else:
+            raise ValueError("Local search backend needs LOCAL_INDEX_PATH or a MongoDB collection")
+        products_path = products_path_for(local_index_path) if local_index_path else None
+        if products_path and os.path.exists(products_path):
+            backend.catalog = InMemoryProductCatalog.from_jsonl(products_path)
+        elif products_collection is not None:
+            backend.catalog = MongoProductCatalog(products_collection, max_time_ms=max_time_ms)
+        print(f"Local vector index ready ({len(backend.documents)} chunks, mode={local_index_mode}, "
+              f"dtype={backend.vectors.dtype}).")
+        return backend
+
+    raise ValueError(f"Unknown search backend: {name}")
@@ -0,0 +1,75 @@
+import os
+import json
+import time
+import argparse
+from typing import Iterator, Optional
+
+import requests
+from dotenv import load_dotenv
+
+
+def iter_query_lines(path: str, limit: Optional[int], chunk_limit: Optional[int]) -> Iterator[bytes]:
+    """
+    Read a query file lazily and yield one NDJSON request line per query
+
+    Lines of a .jsonl/.ndjson file are JSON objects ({"text", "limit", "chunk_limit", "id"})
+    or JSON strings; any other file is read as plain text, one query per line.
+    """
+    is_json = path.endswith(('.jsonl', '.ndjson'))
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line) if is_json else {"text": line, "id": line_number}
+            if isinstance(item, str):
+                item = {"text": item}
+            if limit is not None:
+                item.setdefault("limit", limit)
+            if chunk_limit is not None:
+                item.setdefault("chunk_limit", chunk_limit)
+            yield (json.dumps(item, ensure_ascii=False) + "\n").encode('utf-8')
+
+
+def run_stream_search(input_path: str, output_path: str, api_url: str,
+                      limit: Optional[int] = None, chunk_limit: Optional[int] = None,
+                      timeout: float = 3600) -> None:
+    """
+    Send a query file to /search/stream and write the NDJSON results as they arrive
+
+    Both the upload and the download are streamed, so memory stays flat for any file size.
+    """
+    start_time = time.perf_counter()
+    results, errors = 0, 0
+    with requests.post(f"{api_url.rstrip('/')}/search/stream",
+                       data=iter_query_lines(input_path, limit, chunk_limit),
+                       headers={"Content-Type": "application/x-ndjson"},
+                       stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        with open(output_path, 'w', encoding='utf-8') as out:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                out.write(line.decode('utf-8') + "\n")
+                results += 1
+                errors += 'error' in json.loads(line)
+                if results % 1000 == 0:
+                    elapsed = time.perf_counter() - start_time
+                    print(f"{results} queries ({results / elapsed:.1f} queries/sec)")
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Wrote {results} results to {output_path} in {elapsed:.1f}s ({errors} errors).")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Bulk product search through the /search/stream endpoint")
+    parser.add_argument("input", help="Query file: .jsonl/.ndjson of search requests, or plain text (one query per line)")
+    parser.add_argument("output", help="NDJSON output file, one result line per query in input order")
+    parser.add_argument("--api", default=os.getenv('API_URL', 'http://localhost:8001'),
+                        help="API base URL (default: http://localhost:8001)")
+    parser.add_argument("--limit", type=int, default=None, help="Products per query when not set in the file")
+    parser.add_argument("--chunk-limit", type=int, default=None, help="Chunks per query when not set in the file")
+    args = parser.parse_args()
+
+    run_stream_search(args.input, args.output, args.api, limit=args.limit, chunk_limit=args.chunk_limit)
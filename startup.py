@@ -0,0 +1,53 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+
+class StartupState:
+    """
+    Tracks the warm-up phases of the API process for the readiness probe
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.error: Optional[str] = None
+        self.current_phase: Optional[str] = None
+        # Phase that raised, kept after current_phase is cleared for mark_failed
+        self.failed_phase: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self.started_at = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time a startup phase and log its duration
+        """
+        self.current_phase = name
+        print(f"[startup] {name}...")
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.failed_phase = name
+            raise
+        finally:
+            self.timings[name] = round(time.perf_counter() - start, 3)
+            print(f"[startup] {name} took {self.timings[name]:.2f}s")
+            self.current_phase = None
+
+    def mark_ready(self) -> None:
+        self.ready = True
+        self.timings["total"] = round(time.perf_counter() - self.started_at, 3)
+        print(f"[startup] ready after {self.timings['total']:.2f}s")
+
+    def mark_failed(self, error: Exception) -> None:
+        self.error = f"{self.failed_phase or self.current_phase or 'startup'}: {error}"
+        print(f"[startup] failed: {self.error}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "phase": self.current_phase,
+            "error": self.error,
+            "timings_seconds": self.timings
+        }
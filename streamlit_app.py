@@ -81,15 +81,15 @@ def search_products(query, limit=5, api_url="http://localhost:8001"):
             timeout=30
         )
         if response.status_code == 200:
-            return response.json(), None
+            return response.json(), None, response.headers.get("Server-Timing")
         else:
-            return None, f"Lỗi API: {response.status_code} - {response.text}"
+            return None, f"Lỗi API: {response.status_code} - {response.text}", None
     except requests.exceptions.ConnectionError:
-        return None, "Không thể kết nối đến API. Vui lòng kiểm tra xem API server đã chạy chưa."
+        return None, "Không thể kết nối đến API. Vui lòng kiểm tra xem API server đã chạy chưa.", None
     except requests.exceptions.Timeout:
-        return None, "Timeout: API mất quá nhiều thời gian để phản hồi."
+        return None, "Timeout: API mất quá nhiều thời gian để phản hồi.", None
     except Exception as e:
-        return None, f"Lỗi không xác định: {str(e)}"
+        return None, f"Lỗi không xác định: {str(e)}", None
 
 # Hàm lấy thông tin về chunking
 def get_chunking_info(api_url="http://localhost:8001"):
@@ -229,7 +229,7 @@ if search_button or (search_query and search_query != st.session_state.get('last
         # Hiển thị loading
         with st.spinner(f"🔍 Đang tìm kiếm với chunking '{search_query}'..."):
             start_time = time.time()
-            results, error = search_products(search_query, limit, api_url)
+            results, error, server_timing = search_products(search_query, limit, api_url)
             search_time = time.time() - start_time
         
         if error:
@@ -247,6 +247,11 @@ if search_button or (search_query and search_query != st.session_state.get('last
         elif results:
             # Hiển thị kết quả
             st.success(f"✅ Tìm thấy {len(results)} kết quả cho '{search_query}' trong {search_time:.2f}s")
+            if server_timing:
+                # Header Server-Timing của API (bật bằng SERVER_TIMING=true)
+                st.caption("⏱️ " + " · ".join(
+                    f"{part.split(';')[0].strip()}: {part.split('dur=')[-1]} ms" for part in server_timing.split(',')
+                ))
             
             # Tabs cho các cách hiển thị khác nhau
             tab1, tab2, tab3 = st.tabs(["📋 Danh sách", "📊 Bảng dữ liệu", "📈 Phân tích"])
@@ -1,6 +1,12 @@
 import re
-from typing import List, Dict, Any
-from sentence_transformers import SentenceTransformer
+import math
+import time
+import heapq
+from typing import List, Dict, Any, Callable, Tuple, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # Only needed for annotations; importing it pulls in torch
+    from sentence_transformers import SentenceTransformer
 
 class TextChunker:
     """
@@ -104,7 +110,10 @@ class TextChunker:
     
     def chunk_product_description(self, product: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
-        Create chunks for a product's description with metadata
+        Create chunks for a product's description
+        
+        Chunk documents only carry the product_id; the product metadata is
+        stored once per product (see product_catalog.build_product_metadata).
         
         Args:
             product: Product dictionary containing description info
@@ -121,46 +130,113 @@ class TextChunker:
         
         for chunk in chunks:
             # Create a new document for each chunk
+            # Product fields live in the products collection (product_catalog.py)
             chunk_doc = {
-                # Core product info
                 'product_id': product.get('data_product'),
-                'name': product.get('name'),
-                'url': product.get('url'),
-                'brand': product.get('brand'),
-                'category_name': product.get('category_name'),
-                'price': product.get('price'),
-                'market_price': product.get('market_price'),
-                'average_rating': product.get('average_rating'),
-                
-                # Chunk-specific info
-                'chunk_text': chunk['text'],
+                'chunk_text': chunk['text'],  # This will be used for vector search
                 'chunk_id': chunk['chunk_id'],
                 'chunk_start_pos': chunk['start_pos'],
-                'is_chunk': True,
-                
-                # Original full description for reference
-                'full_description': description[:200] + "..." if len(description) > 200 else description,
-                
-                # For search display
-                'descriptioninfo': chunk['text']  # This will be used for vector search
+                'is_chunk': True
             }
             
             chunked_products.append(chunk_doc)
         
         return chunked_products
 
+def build_product_documents(product: Dict[str, Any], chunker: TextChunker) -> List[Dict[str, Any]]:
+    """
+    Create the chunk documents (without embeddings) of a single product
+    
+    Products without a description get one minimal document embedded from the name.
+    """
+    chunks = chunker.chunk_product_description(product)
+    if chunks:
+        return chunks
+    
+    # If no description, create a minimal document
+    minimal_doc = {
+        'product_id': product.get('data_product'),
+        'chunk_text': product.get('name', ''),
+        'chunk_id': 0,
+        'is_chunk': False
+    }
+    return [minimal_doc]
+
+def encode_texts(texts: List[str],
+                 model: 'SentenceTransformer',
+                 batch_size: int = 128,
+                 verbose: bool = True) -> List[Any]:
+    """
+    Encode texts in length-sorted batches and return the vectors in the original order
+    
+    Sorting by length means each batch holds texts of similar length (little
+    padding); the vectors are scattered back to their positions afterwards.
+    
+    Args:
+        texts: Texts to encode
+        model: SentenceTransformer model for creating embeddings
+        batch_size: Number of texts encoded per model call
+        verbose: Print progress every 50 batches
+        
+    Returns:
+        One vector (NumPy array) per text
+    """
+    order = sorted(range(len(texts)), key=lambda index: len(texts[index]), reverse=True)
+    total_batches = (len(order) + batch_size - 1) // batch_size
+    vectors: List[Any] = [None] * len(texts)
+    
+    for batch_number, start in enumerate(range(0, len(order), batch_size), 1):
+        indices = order[start:start + batch_size]
+        embeddings = model.encode([texts[index] for index in indices], batch_size=batch_size)
+        
+        for index, embedding in zip(indices, embeddings):
+            vectors[index] = embedding
+        
+        if verbose and batch_number % 50 == 0:
+            print(f"Encoded batch {batch_number}/{total_batches}")
+    
+    return vectors
+
+def embed_documents(documents: List[Dict[str, Any]],
+                    model: 'SentenceTransformer',
+                    batch_size: int = 128,
+                    verbose: bool = True) -> float:
+    """
+    Add a description_vector to every document (see encode_texts)
+    
+    Args:
+        documents: Chunk documents, modified in place
+        model: SentenceTransformer model for creating embeddings
+        batch_size: Number of chunk texts encoded per model call
+        verbose: Print progress every 50 batches
+        
+    Returns:
+        Seconds spent encoding
+    """
+    start_time = time.perf_counter()
+    vectors = encode_texts([doc['chunk_text'] or '' for doc in documents], model,
+                           batch_size=batch_size, verbose=verbose)
+    for doc, vector in zip(documents, vectors):
+        doc['description_vector'] = vector.tolist()
+    return time.perf_counter() - start_time
+
 def process_products_with_chunking(products: List[Dict[str, Any]], 
-                                 model: SentenceTransformer,
+                                 model: 'SentenceTransformer',
                                  chunk_size: int = 300, 
-                                 overlap: int = 50) -> List[Dict[str, Any]]:
+                                 overlap: int = 50,
+                                 batch_size: int = 128) -> List[Dict[str, Any]]:
     """
     Process a list of products, creating chunks and embeddings
     
+    Chunk texts of all products are gathered first and then encoded together
+    in large length-sorted batches (see embed_documents).
+    
     Args:
         products: List of product dictionaries
         model: SentenceTransformer model for creating embeddings
         chunk_size: Maximum characters per chunk
         overlap: Overlap between chunks
+        batch_size: Number of chunk texts encoded per model call
         
     Returns:
         List of processed documents with embeddings
@@ -175,70 +251,93 @@ def process_products_with_chunking(products: List[Dict[str, Any]],
             print(f"Processed {i}/{len(products)} products")
         
         # Get chunks for this product
-        chunks = chunker.chunk_product_description(product)
-        
-        if chunks:
-            # Create embeddings for each chunk
-            chunk_texts = [chunk['chunk_text'] for chunk in chunks]
-            embeddings = model.encode(chunk_texts)
-            # Add embeddings to chunks
-            for chunk, embedding in zip(chunks, embeddings):
-                chunk['description_vector'] = embedding.tolist()
-                all_documents.append(chunk)
-        else:
-            # If no description, create a minimal document
-            minimal_doc = {
-                'product_id': product.get('data_product'),
-                'name': product.get('name'),
-                'url': product.get('url'),
-                'brand': product.get('brand'),
-                'category_name': product.get('category_name'),
-                'price': product.get('price'),
-                'market_price': product.get('market_price'),
-                'average_rating': product.get('average_rating'),
-                'chunk_text': product.get('name', ''),
-                'chunk_id': 0,
-                'is_chunk': False,
-                'descriptioninfo': product.get('name', ''),
-                'description_vector': model.encode([product.get('name', '')]).tolist()[0]
-            }
-            all_documents.append(minimal_doc)
+        all_documents.extend(build_product_documents(product, chunker))
+    
+    # Create embeddings for all chunks
+    elapsed = embed_documents(all_documents, model, batch_size=batch_size)
     
-    print(f"Created {len(all_documents)} document chunks from {len(products)} products")
+    chunks_per_second = len(all_documents) / elapsed if elapsed > 0 else 0.0
+    print(f"Created {len(all_documents)} document chunks from {len(products)} products "
+          f"(encoded in {elapsed:.1f}s, {chunks_per_second:.1f} chunks/sec)")
     return all_documents
 
-def aggregate_search_results(results: List[Dict[str, Any]], max_products: int = 5) -> List[Dict[str, Any]]:
+def _softmax_weighted(scores: List[float], temperature: float) -> float:
+    top = scores[0]
+    weights = [math.exp((score - top) / temperature) for score in scores]
+    return sum(w * score for w, score in zip(weights, scores)) / sum(weights)
+
+
+# Product-level scoring functions; each receives the product's chunk scores sorted descending
+PRODUCT_SCORERS: Dict[str, Callable[..., float]] = {
+    'max': lambda scores, top_n, temperature: scores[0],
+    'sum_top_n': lambda scores, top_n, temperature: sum(scores[:top_n]),
+    'softmax': lambda scores, top_n, temperature: _softmax_weighted(scores, temperature),
+}
+
+
+def build_product_scorer(scoring: Union[str, Callable[[List[float]], float]] = 'max',
+                         top_n: int = 3,
+                         temperature: float = 0.1) -> Callable[[List[float]], float]:
+    """
+    Return the product scoring function for aggregate_search_results
+
+    Raises:
+        ValueError: Unknown scoring name, or a non-positive softmax temperature
+    """
+    if callable(scoring):
+        return scoring
+    if scoring not in PRODUCT_SCORERS:
+        raise ValueError(f"Unknown product scoring: {scoring}")
+    if scoring == 'softmax' and not temperature > 0:
+        raise ValueError(f"Softmax product scoring needs a temperature > 0 (got {temperature})")
+    scorer = PRODUCT_SCORERS[scoring]
+    return lambda scores: scorer(scores, top_n, temperature)
+
+
+def aggregate_search_results(results: List[Dict[str, Any]],
+                             max_products: int = 5,
+                             scoring: Union[str, Callable[[List[float]], float]] = 'max',
+                             top_n: int = 3,
+                             temperature: float = 0.1,
+                             max_relevant_chunks: int = 3) -> List[Dict[str, Any]]:
     """
     Aggregate chunked search results back to product level
     
+    Chunks are grouped in a single pass and the best products are selected
+    with a heap, so the cost stays linear in the number of chunks.
+    
     Args:
         results: List of search results (chunks)
         max_products: Maximum number of unique products to return
+        scoring: Product score from its chunk scores: 'max', 'sum_top_n'
+                 (sum of the top_n scores), 'softmax' (softmax-weighted mean with
+                 the given temperature) or a callable taking the scores sorted descending
+        top_n: Number of chunk scores summed by 'sum_top_n'
+        temperature: Softmax temperature for 'softmax'
+        max_relevant_chunks: Number of chunk texts returned per product
         
     Returns:
-        List of aggregated product results
+        List of aggregated product results, best first
     """
-    # Group results by product_id
-    product_groups = {}
-    
+    score_product = build_product_scorer(scoring, top_n, temperature)
+
+    # Group results by product_id: product_id -> [(score, chunk)]
+    product_groups: Dict[Any, List[Tuple[float, Dict[str, Any]]]] = {}
     for result in results:
-        product_id = result.get('product_id')
-        if product_id not in product_groups:
-            product_groups[product_id] = []
-        product_groups[product_id].append(result)
-    
-    # Aggregate each product group
+        product_groups.setdefault(result.get('product_id'), []).append((result.get('score') or 0, result))
+
+    def ranked_group(item):
+        product_id, chunks = item
+        chunks.sort(key=lambda chunk: chunk[0], reverse=True)
+        return score_product([score for score, _ in chunks]), product_id, chunks
+
+    # Top products by score (ties keep search order)
+    best = heapq.nlargest(max_products, map(ranked_group, product_groups.items()), key=lambda group: group[0])
+
     aggregated_results = []
-    
-    for product_id, chunks in product_groups.items():
-        if len(aggregated_results) >= max_products:
-            break
-            
-        # Find the best chunk (highest score)
-        best_chunk = max(chunks, key=lambda x: x.get('score', 0))
-        
-        # Create aggregated result
-        aggregated_result = {
+    for score, product_id, chunks in best:
+        best_chunk = chunks[0][1]
+        aggregated_results.append({
             'product_id': product_id,
             'name': best_chunk.get('name'),
             'url': best_chunk.get('url'),
@@ -247,17 +346,12 @@ def aggregate_search_results(results: List[Dict[str, Any]], max_products: int =
             'price': best_chunk.get('price'),
             'market_price': best_chunk.get('market_price'),
             'average_rating': best_chunk.get('average_rating'),
-            'score': best_chunk.get('score'),
+            'score': score,
             
             # Combine relevant chunks for description
             'descriptioninfo': best_chunk.get('chunk_text', ''),
-            'relevant_chunks': [chunk.get('chunk_text', '') for chunk in chunks[:3]],  # Top 3 chunks
+            'relevant_chunks': [chunk.get('chunk_text', '') for _, chunk in chunks[:max_relevant_chunks]],
             'total_chunks_found': len(chunks)
-        }
-        
-        aggregated_results.append(aggregated_result)
-    
-    # Sort by score
-    aggregated_results.sort(key=lambda x: x.get('score', 0), reverse=True)
+        })
     
-    return aggregated_results[:max_products]
\ No newline at end of file
+    return aggregated_results